@@ -0,0 +1,191 @@
+"""
+Local stand-in for the parts of the AnythingLLM developer API that
+`rundocling-fixed.py --push` uses, for trying uploads without a real
+AnythingLLM instance. Standard library only; everything is kept in memory.
+
+    python anythingllm_standin.py --port 3001 --api-key test
+    (in docling_settings.env: ANYTHINGLLM_URL=http://localhost:3001, ANYTHINGLLM_API_KEY=test)
+
+Endpoints (same paths and response shapes as AnythingLLM):
+  POST   /api/v1/document/upload                    multipart "file"
+  POST   /api/v1/document/raw-text                  {"textContent", "metadata"}
+  POST   /api/v1/workspace/<slug>/update-embeddings {"adds", "deletes"}
+  DELETE /api/v1/system/remove-documents            {"names"}
+  GET    /api/v1/documents                          stored documents
+  GET    /api/v1/workspace/<slug>                   embedded documents
+
+--fail-every N answers every Nth document request with HTTP 500, to watch
+the uploader's retries and clean-up.
+"""
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("anythingllm-standin")
+
+
+class StandInState:
+    """Stored documents and workspace embeddings, shared by all request threads."""
+
+    def __init__(self, api_key: str, fail_every: int = 0):
+        self.api_key = api_key
+        self.fail_every = fail_every
+        self.documents: dict[str, dict] = {}      # location -> document record
+        self.workspaces: dict[str, set] = {}      # slug -> embedded locations
+        self._requests = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        return bool(self.fail_every) and next(self._requests) % self.fail_every == 0
+
+    def store(self, name: str, text: str, metadata: dict) -> dict:
+        location = f"custom-documents/{name}-{uuid.uuid4()}.json"
+        doc = {
+            "location": location,
+            "name": location.rsplit("/", 1)[-1],
+            "title": metadata.get("title") or name,
+            "docSource": metadata.get("docSource", ""),
+            "description": metadata.get("description", ""),
+            "chunkSource": metadata.get("chunkSource", ""),
+            "wordCount": len(text.split()),
+            "token_count_estimate": max(1, len(text) // 4),
+        }
+        with self.lock:
+            self.documents[location] = {**doc, "pageContent": text}
+        return doc
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    state: StandInState = None
+
+    def log_message(self, fmt, *args) -> None:
+        log.info(fmt, *args)
+
+    def _send_json(self, code: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization") == f"Bearer {self.state.api_key}":
+            return True
+        self._send_json(403, {"error": "No valid api key found."})
+        return False
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        with self.state.lock:
+            if parts == ["api", "v1", "documents"]:
+                items = [{"type": "file", **{k: v for k, v in d.items() if k != "pageContent"}}
+                         for d in self.state.documents.values()]
+                self._send_json(200, {"localFiles": {"name": "documents", "type": "folder", "items": [
+                    {"name": "custom-documents", "type": "folder", "items": items}]}})
+            elif parts[:3] == ["api", "v1", "workspace"] and len(parts) == 4:
+                docs = [{"docpath": loc} for loc in sorted(self.state.workspaces.get(parts[3], ()))]
+                self._send_json(200, {"workspace": [{"slug": parts[3], "documents": docs}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        body = self._body()
+        if parts in (["api", "v1", "document", "upload"], ["api", "v1", "document", "raw-text"]):
+            if self.state.should_fail():
+                self._send_json(500, {"success": False, "error": "injected failure (--fail-every)"})
+                return
+            if parts[-1] == "upload":
+                doc = self._store_upload(body)
+            else:
+                spec = json.loads(body or b"{}")
+                if not spec.get("textContent"):
+                    self._send_json(422, {"success": False, "error": "textContent is required"})
+                    return
+                meta = spec.get("metadata") or {}
+                doc = self.state.store("raw-" + str(meta.get("title", "text"))[:40].replace("/", "_"),
+                                       spec["textContent"], meta)
+            if doc is None:
+                self._send_json(422, {"success": False, "error": "multipart field 'file' is required",
+                                      "documents": []})
+                return
+            self._send_json(200, {"success": True, "error": None, "documents": [doc]})
+        elif parts[:3] == ["api", "v1", "workspace"] and parts[4:] == ["update-embeddings"]:
+            spec = json.loads(body or b"{}")
+            with self.state.lock:
+                unknown = [loc for loc in spec.get("adds", []) if loc not in self.state.documents]
+                if unknown:
+                    self._send_json(400, {"error": f"unknown document(s): {unknown[:3]}"})
+                    return
+                embedded = self.state.workspaces.setdefault(parts[3], set())
+                embedded.difference_update(spec.get("deletes", []))
+                embedded.update(spec.get("adds", []))
+                docs = [{"docpath": loc} for loc in sorted(embedded)]
+            self._send_json(200, {"workspace": {"slug": parts[3], "documents": docs}})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_DELETE(self) -> None:
+        if not self._authorized():
+            return
+        if self.path.split("?")[0].rstrip("/") != "/api/v1/system/remove-documents":
+            self._send_json(404, {"error": "not found"})
+            return
+        names = json.loads(self._body() or b"{}").get("names", [])
+        with self.state.lock:
+            for name in names:
+                self.state.documents.pop(name, None)
+                for embedded in self.state.workspaces.values():
+                    embedded.discard(name)
+        self._send_json(200, {"success": True, "message": "Documents removed successfully"})
+
+    def _store_upload(self, body: bytes) -> dict | None:
+        """Parse a multipart/form-data upload and store its 'file' part."""
+        head = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode("latin-1")
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(head + body)
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                filename = part.get_filename() or "upload"
+                text = part.get_payload(decode=True).decode("utf-8", errors="replace")
+                return self.state.store(filename, text, {"title": filename})
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the AnythingLLM document API")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--api-key", default="test", help="Bearer token clients must send (default: test)")
+    parser.add_argument("--fail-every", type=int, default=0, metavar="N",
+                        help="Answer every Nth document request with HTTP 500 (default: never)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", datefmt="%H:%M:%S")
+
+    handler = type("BoundStandInHandler", (StandInHandler,),
+                   {"state": StandInState(args.api_key, args.fail_every)})
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    server.daemon_threads = True
+    log.info("AnythingLLM stand-in on http://127.0.0.1:%d (API key %r)", args.port, args.api_key)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
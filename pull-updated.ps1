@@ -8,16 +8,21 @@ Write-Host " Docling Serve CPU Launcher (PowerShell)   " -ForegroundColor Cyan
 Write-Host "===========================================" -ForegroundColor Cyan
 Write-Host ""
 
-# 1) Pull the latest official image
-Write-Host "[1/4] Pulling latest Docling Serve CPU image..." -ForegroundColor Yellow
-docker pull ghcr.io/docling-project/docling-serve-cpu:latest
+# 1) Pull the latest official image (skipped when rundocling-fixed.py restarts the container itself:
+#    --tune-container trials and crash recovery mid-batch, so a batch never switches image versions)
+if ($env:DOCLING_SKIP_PULL -eq "1") {
+    Write-Host "[1/4] Skipping image pull (DOCLING_SKIP_PULL=1)." -ForegroundColor Yellow
+} else {
+    Write-Host "[1/4] Pulling latest Docling Serve CPU image..." -ForegroundColor Yellow
+    docker pull ghcr.io/docling-project/docling-serve-cpu:latest
 
-if ($LASTEXITCODE -ne 0) {
-    Write-Host "ERROR: Docker pull failed. Check your Docker login / network." -ForegroundColor Red
-    exit 1
-}
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "ERROR: Docker pull failed. Check your Docker login / network." -ForegroundColor Red
+        exit 1
+    }
 
-Write-Host "OK: Image pull completed: ghcr.io/docling-project/docling-serve-cpu:latest" -ForegroundColor Green
+    Write-Host "OK: Image pull completed: ghcr.io/docling-project/docling-serve-cpu:latest" -ForegroundColor Green
+}
 Write-Host ""
 
 # 2) Show basic image details (use single quotes to avoid interpolation issues)
@@ -79,21 +84,50 @@ if ($existing) {
 }
 Write-Host ""
 
-# 6) Run Docling Serve CPU container with dynamic port
+# 6) Performance settings: the environment (set by rundocling-fixed.py) wins,
+#    then docling_settings.env; empty means the image's own defaults
+$SettingsFile = Join-Path $PSScriptRoot "docling_settings.env"
+
+function Get-DoclingSetting {
+    param([string]$Name)
+
+    $value = [Environment]::GetEnvironmentVariable($Name)
+    if ($value) { return $value.Trim() }
+    if (Test-Path $SettingsFile) {
+        $line = Get-Content $SettingsFile | Where-Object { $_ -match ("^\s*{0}\s*=" -f $Name) } | Select-Object -Last 1
+        if ($line) { return ($line -split "=", 2)[1].Trim().Trim('"') }
+    }
+    return ""
+}
+
+$DoclingCpus    = Get-DoclingSetting "DOCLING_CPUS"
+$DoclingThreads = Get-DoclingSetting "DOCLING_THREADS"
+$EngineWorkers  = Get-DoclingSetting "DOCLING_ENGINE_WORKERS"
+
+$RunArgs = @(
+    "run", "-d",
+    "--platform", "linux/amd64",
+    "-p", "$SelectedPort`:5001",
+    "-v", "${PWD}:/app/data",
+    "-e", "DOCLING_SERVE_MAX_SYNC_WAIT=10800"
+)
+if ($DoclingCpus)    { $RunArgs += @("--cpus", $DoclingCpus) }
+if ($DoclingThreads) { $RunArgs += @("-e", "OMP_NUM_THREADS=$DoclingThreads", "-e", "DOCLING_NUM_THREADS=$DoclingThreads") }
+if ($EngineWorkers)  { $RunArgs += @("-e", "DOCLING_SERVE_ENG_LOC_NUM_WORKERS=$EngineWorkers") }
+$RunArgs += @("--name", "docling-serve-cpu", "ghcr.io/docling-project/docling-serve-cpu:latest")
+
+# 7) Run Docling Serve CPU container with dynamic port
 #    Docling Serve listens on 5001 inside the container by default
 Write-Host "[4/4] Starting Docling Serve CPU container in detached mode..." -ForegroundColor Yellow
 Write-Host ("Container name : {0}" -f 'docling-serve-cpu') -ForegroundColor DarkCyan
 Write-Host ("Host port      : {0}" -f $SelectedPort) -ForegroundColor DarkCyan
 Write-Host "Container port : 5001" -ForegroundColor DarkCyan
+Write-Host ("CPU limit      : {0}" -f $(if ($DoclingCpus) { $DoclingCpus } else { 'none' })) -ForegroundColor DarkCyan
+Write-Host ("Threads/worker : {0}" -f $(if ($DoclingThreads) { $DoclingThreads } else { 'image default' })) -ForegroundColor DarkCyan
+Write-Host ("Engine workers : {0}" -f $(if ($EngineWorkers) { $EngineWorkers } else { 'image default' })) -ForegroundColor DarkCyan
 Write-Host ""
 
-docker run -d `
-  --platform linux/amd64 `
-  -p "$SelectedPort`:5001" `
-  -v "${PWD}:/app/data" `
-  -e DOCLING_SERVE_MAX_SYNC_WAIT=10800 `
-  --name docling-serve-cpu `
-  ghcr.io/docling-project/docling-serve-cpu:latest | Out-Null
+docker @RunArgs | Out-Null
 
 if ($LASTEXITCODE -ne 0) {
     Write-Host "ERROR: Failed to start docling-serve-cpu container." -ForegroundColor Red
@@ -103,7 +137,7 @@ if ($LASTEXITCODE -ne 0) {
 Write-Host "OK: Docling Serve CPU container started successfully." -ForegroundColor Green
 Write-Host ""
 
-# 7) Show helpful URLs and summary
+# 8) Show helpful URLs and summary
 Write-Host "===========================================" -ForegroundColor Cyan
 Write-Host " Docling Serve is now running              " -ForegroundColor Cyan
 Write-Host "===========================================" -ForegroundColor Cyan
@@ -4,7 +4,7 @@ import sys
 # ============================================================
 # AUTO-INSTALL MISSING DEPENDENCIES
 # ============================================================
-REQUIRED_PACKAGES = ["requests", "python-dotenv", "Pillow"]
+REQUIRED_PACKAGES = ["requests", "python-dotenv", "Pillow", "numpy", "pypdf"]
 for _pkg in REQUIRED_PACKAGES:
     try:
         __import__(_pkg)
@@ -25,12 +25,22 @@ import json
 import time
 import re
 import threading
+import queue
+import heapq
+import getpass
+import socket
 import requests
 import logging
 import argparse
 import base64
 import io
+import gzip
+import tempfile
+import hashlib
+import hmac
+import mmap
 import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # ============================================================
 # DOCLING PDF TO MARKDOWN PROCESSOR
@@ -49,6 +59,16 @@ PS1_TIMEOUT_SEC       = 300    # max seconds to wait for PowerShell to output a
 HEALTH_CHECK_TIMEOUT  = 180    # max seconds to wait for Docker /health to return 200
 HEALTH_CHECK_INTERVAL = 3      # seconds between each /health probe
 CONVERSION_TIMEOUT    = 10800  # max seconds per PDF conversion request (default: 3 hrs)
+MAX_CONTAINER_RESTARTS = 3     # automatic container restarts allowed per session
+MAX_FILE_CRASHES      = 2      # container crashes one file may cause before it is marked failed
+CONTAINER_NAME        = "docling-serve-cpu"  # name given to the container by pull-updated.ps1
+ETA_REFRESH_SEC       = 1      # seconds between batch ETA console refreshes
+FILTER_DEBOUNCE_MS    = 150    # folder picker re-filters this long after the last keystroke
+PAGE_SCAN_MAX_MB      = 64     # PDFs larger than this skip the page-count scan (size-only estimate)
+OCR_MIN_TEXT_CHARS    = 25     # a page with fewer extractable characters counts as scanned
+OCR_PREFLIGHT_PAGES   = 250    # max pages read by the OCR pre-flight; longer files are sampled evenly and keep OCR
+ADMISSION_MAX_BYPASS  = 8      # small files that may overtake a waiting large one before it goes next
+PACK_SMALL_PAGES      = 3      # PDFs with at most this many pages may share a request with others
 
 
 # ============================================================
@@ -83,57 +103,329 @@ WEBP_QUALITY          = int(_env("WEBP_QUALITY", "65"))
 WEBP_METHOD           = int(_env("WEBP_METHOD", "6"))
 WEBP_MAX_WIDTH        = int(_env("WEBP_MAX_WIDTH", "1920"))
 WEBP_MAX_HEIGHT       = int(_env("WEBP_MAX_HEIGHT", "1080"))
+WEBP_BUDGET_KB        = int(_env("WEBP_BUDGET_KB", "0"))
+WEBP_DOC_BUDGET_KB    = int(_env("WEBP_DOC_BUDGET_KB", "0"))
+WEBP_MIN_QUALITY      = int(_env("WEBP_MIN_QUALITY", "30"))
+BATCH_WORKERS         = int(_env("BATCH_WORKERS", "1"))
+KEEP_DOCLING_JSON     = _env("KEEP_DOCLING_JSON", "false").lower() == "true"
+OCR_PREFLIGHT         = _env("OCR_PREFLIGHT", "true").lower() == "true"
+DOCLING_PROFILE       = _env("DOCLING_PROFILE", "rag")
+SLIDE_DEDUP_SIMILARITY = float(_env("SLIDE_DEDUP_SIMILARITY", "1.0"))
+ADMISSION_MAX_MB      = float(_env("ADMISSION_MAX_MB", "256"))
+ADMISSION_MAX_PAGES   = int(_env("ADMISSION_MAX_PAGES", "600"))
+PACK_MAX_FILES        = int(_env("PACK_MAX_FILES", "8"))
+PACK_MAX_PAGES        = int(_env("PACK_MAX_PAGES", "24"))
+PACK_MAX_MB           = float(_env("PACK_MAX_MB", "16"))
+SEARCH_INDEX          = _env("SEARCH_INDEX", "true").lower() == "true"
+SEARCH_INDEX_PATH     = _env("SEARCH_INDEX_PATH",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), "docling_index.sqlite"))
+CHUNK_EXPORT          = _env("CHUNK_EXPORT", "false").lower() == "true"
+CHUNK_MAX_TOKENS      = int(_env("CHUNK_MAX_TOKENS", "512"))
+ANYTHINGLLM_URL       = _env("ANYTHINGLLM_URL", "")
+ANYTHINGLLM_API_KEY   = _env("ANYTHINGLLM_API_KEY", "")
+ANYTHINGLLM_WORKSPACE = _env("ANYTHINGLLM_WORKSPACE", "")
+ANYTHINGLLM_CONCURRENCY = int(_env("ANYTHINGLLM_CONCURRENCY", "4"))
+ANYTHINGLLM_RETRIES   = int(_env("ANYTHINGLLM_RETRIES", "3"))
+POSTPROCESS_WORKERS   = int(_env("POSTPROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+DAEMON_PORT           = int(_env("DOCLING_DAEMON_PORT", "5200"))
+DAEMON_URL            = _env("DOCLING_DAEMON_URL", "")
+DAEMON_TOKEN          = _env("DOCLING_DAEMON_TOKEN", "")
+DAEMON_ROOTS          = [p.strip() for p in _env("DOCLING_DAEMON_ROOTS", "").split(os.pathsep) if p.strip()]
+EXTERNALIZE_IMAGES    = _env("EXTERNALIZE_IMAGES", "false").lower() == "true"
 
 # ============================================================
 # WEBP RECOMPRESSOR
 # ============================================================
-def recompress_to_webp(markdown, image_paths=None):
-    if not WEBP_ENABLED:
-        return markdown
+def _load_pil():
+    """Return PIL.Image, or None (with a warning) if Pillow is unavailable."""
     try:
         from PIL import Image
-        import io as _io
     except ImportError:
         log.warning("Pillow not available — skipping WebP recompression")
-        return markdown
-    def _to_webp_b64(img_bytes):
-        img = Image.open(_io.BytesIO(img_bytes)).convert("RGB")
-        if WEBP_MAX_WIDTH and img.width > WEBP_MAX_WIDTH:
-            ratio = WEBP_MAX_WIDTH / img.width
-            img = img.resize((WEBP_MAX_WIDTH, int(img.height * ratio)), Image.LANCZOS)
-        if WEBP_MAX_HEIGHT and img.height > WEBP_MAX_HEIGHT:
-            ratio = WEBP_MAX_HEIGHT / img.height
-            img = img.resize((int(img.width * ratio), WEBP_MAX_HEIGHT), Image.LANCZOS)
-        buf = _io.BytesIO()
-        img.save(buf, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
-        return base64.b64encode(buf.getvalue()).decode("ascii")
-    if image_paths:
-        name_to_path = {}
-        for p in image_paths:
-            stem = os.path.splitext(os.path.basename(p))[0]
-            name_to_path[stem] = p
-        def _fill(m):
-            stem = os.path.splitext(m.group(1))[0]
-            disk = name_to_path.get(stem)
-            if disk and os.path.isfile(disk):
-                with open(disk, "rb") as fh: raw = fh.read()
-                b64 = _to_webp_b64(raw)
-                log.info("  Embedded from disk: %s", os.path.basename(disk))
-                return "![" + stem + "](data:image/webp;base64," + b64 + ")"
-            return m.group(0)
-        markdown = re.sub(
-            r"\*\[Slide ([^:]+): image with no extractable text\]\*",
-            _fill, markdown)
-    def _reencode(m):
-        raw = base64.b64decode(m.group(2))
-        return "![" + m.group(1) + "](data:image/webp;base64," + _to_webp_b64(raw) + ")"
-    markdown = re.sub(
-        r"!\[([^\]]*)\]\(data:image/(?:jpeg|png|jpg);base64,([A-Za-z0-9+/=]+)\)",
-        _reencode, markdown)
-    return markdown
+        return None
+    return Image
+
+
+def webp_defaults() -> dict:
+    """WebP settings from docling_settings.env; profiles override individual keys."""
+    return {
+        "enabled": WEBP_ENABLED,
+        "quality": WEBP_QUALITY,
+        "method": WEBP_METHOD,
+        "max_width": WEBP_MAX_WIDTH,
+        "max_height": WEBP_MAX_HEIGHT,
+        "budget_kb": WEBP_BUDGET_KB,
+        "doc_budget_kb": WEBP_DOC_BUDGET_KB,
+        "min_quality": WEBP_MIN_QUALITY,
+    }
+
 
+_BUDGET_SEARCH_METHOD = 4   # encoder effort used while searching for a quality that fits a budget
 
 
+def encode_webp(img_bytes: bytes, src_fmt: str, webp: dict, budget_bytes: int = 0) -> tuple[bytes, str, str]:
+    """
+    Re-encode one image as WebP. Without a budget this is a single encode at
+    the profile's quality and method. With a budget, quality is binary-searched
+    between min_quality and quality at a fast encoder effort, keeping the best
+    quality that fits; the slowest effort (method 6) is only tried when even
+    min_quality misses, and the image is scaled down if that misses too. Either way the source image is kept when it is already
+    no bigger than the WebP result. Returns (bytes, format, note).
+    """
+    Image = _load_pil()
+    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+    max_w, max_h = webp["max_width"], webp["max_height"]
+    if max_w and img.width > max_w:
+        ratio = max_w / img.width
+        img = img.resize((max_w, int(img.height * ratio)), Image.LANCZOS)
+    if max_h and img.height > max_h:
+        ratio = max_h / img.height
+        img = img.resize((int(img.width * ratio), max_h), Image.LANCZOS)
+
+    def encode(quality: int, method: int) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=quality, method=method)
+        return buf.getvalue()
+
+    if not budget_bytes:
+        out, note = encode(webp["quality"], webp["method"]), f"q={webp['quality']}"
+    else:
+        quality = webp["quality"]
+        out = encode(quality, _BUDGET_SEARCH_METHOD)
+        if len(out) > budget_bytes:
+            lo, hi, best = min(webp["min_quality"], quality), quality - 1, None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                data = encode(mid, _BUDGET_SEARCH_METHOD)
+                if len(data) <= budget_bytes:
+                    best, lo = (mid, data), mid + 1
+                else:
+                    out, hi = data, mid - 1
+            if best:
+                quality, out = best
+            else:
+                quality = min(webp["min_quality"], quality)
+                out = min(out, encode(quality, 6), key=len)
+        note = f"q={quality}"
+        if len(out) > budget_bytes:
+            # Still too big at the lowest quality: shrink the image to fit instead
+            full, scale = img, (budget_bytes / len(out)) ** 0.5
+            for _ in range(4):
+                img = full.resize((max(1, int(full.width * scale)), max(1, int(full.height * scale))), Image.LANCZOS)
+                out = encode(quality, _BUDGET_SEARCH_METHOD)
+                if len(out) <= budget_bytes:
+                    break
+                scale *= 0.85
+            note += f", scaled to {img.width}x{img.height}" + ("" if len(out) <= budget_bytes else ", over budget")
+
+    if len(img_bytes) <= len(out):
+        return img_bytes, src_fmt, "original kept"
+    return out, "webp", note
+
+
+# Photo-vs-graphic thresholds for "Embed Text Images" (computed on a 128px thumbnail)
+PHOTO_ENTROPY_BITS   = 6.0    # grey-level histogram entropy above this looks photographic
+PHOTO_COLOR_RATIO    = 0.25   # distinct (5-bit) colours per pixel above this looks photographic
+PHOTO_FLAT_FRACTION  = 0.45   # share of zero-gradient pixels below this looks photographic
+_CLASSIFY_THUMB      = 128
+
+
+def classify_image(img_bytes: bytes) -> str:
+    """
+    Classify an image as 'photo' or 'graphic' (text, chart, diagram, screenshot)
+    from three vectorized features of a small thumbnail: grey-level entropy,
+    distinct colour ratio and the share of flat (zero-gradient) pixels.
+    Charts and slides have few colours and large flat areas; photos have
+    neither. Returns 'graphic' when it cannot decide, so nothing is lost.
+    """
+    try:
+        import numpy as np
+        Image = _load_pil()
+        img = Image.open(io.BytesIO(img_bytes))
+        img.draft("RGB", (_CLASSIFY_THUMB, _CLASSIFY_THUMB))   # JPEG: decode at reduced scale
+        img = img.convert("RGB")
+        img.thumbnail((_CLASSIFY_THUMB, _CLASSIFY_THUMB))
+        rgb = np.asarray(img, dtype=np.uint8)
+    except Exception:
+        return "graphic"
+    if rgb.shape[0] < 2 or rgb.shape[1] < 2:
+        return "graphic"
+
+    grey = rgb @ np.array([299, 587, 114], dtype=np.uint32) // 1000
+    hist = np.bincount(grey.ravel(), minlength=256).astype(np.float64)
+    prob = hist[hist > 0] / grey.size
+    entropy = float(-(prob * np.log2(prob)).sum())
+
+    packed = ((rgb >> 3).astype(np.uint32) * np.array([1024, 32, 1], dtype=np.uint32)).sum(axis=2)
+    color_ratio = np.unique(packed).size / packed.size
+
+    g = grey.astype(np.int32)
+    grad = np.abs(np.diff(g, axis=0))[:, :-1] + np.abs(np.diff(g, axis=1))[:-1, :]
+    flat = float((grad == 0).mean())
+
+    votes = (entropy > PHOTO_ENTROPY_BITS) + (color_ratio > PHOTO_COLOR_RATIO) + (flat < PHOTO_FLAT_FRACTION)
+    return "photo" if votes >= 2 else "graphic"
+
+
+# One alternation finds every candidate token; everything else is plain
+# str.find/startswith from that position, so each byte is examined O(1) times.
+_IMAGE_TOKEN_RE = re.compile(r"!\[|\*\[Slide ")
+_B64_RE = re.compile(r"[A-Za-z0-9+/=]*")
+_DATA_PREFIX = "data:image/"
+_SLIDE_SUFFIX = ": image with no extractable text]*"
+_REENCODE_FORMATS = ("jpeg", "png", "jpg")
+
+
+def postprocess_markdown(
+    markdown: str,
+    strip: bool = False,
+    image_paths: list[str] | None = None,
+    externalize_dir: str | None = None,
+    drop_photos: bool = False,
+    webp: dict | None = None,
+    out: io.TextIOBase | None = None,
+) -> str | None:
+    """
+    Single linear scan over the Markdown that finds inline data-URI images and
+    "*[Slide X: image with no extractable text]*" markers and dispatches:
+      strip          — drop every data-URI image
+      drop photos    — with drop_photos, images classify_image() calls a photo
+                       become <!-- image --> before any WebP work is spent
+      externalize    — write the image to externalize_dir and link to it
+      re-encode      — JPEG/PNG data URIs become WebP data URIs
+      fill           — slide markers are replaced by the slide image from disk
+    WebP settings come from `webp` (a profile's settings) or the .env defaults.
+    Output is written to `out`; when no stream is given the result is returned.
+    """
+    sink = out if out is not None else io.StringIO()
+    webp = {**webp_defaults(), **(webp or {})}
+    reencode = webp["enabled"] and _load_pil() is not None
+    budget = webp["budget_kb"] * 1024
+    if reencode and webp["doc_budget_kb"]:
+        # A per-document budget is shared evenly by the images it may contain
+        share = webp["doc_budget_kb"] * 1024 // max(1, markdown.count("](" + _DATA_PREFIX) + markdown.count(_SLIDE_SUFFIX))
+        budget = min(budget, share) if budget else share
+    encoded: list[tuple[int, int]] = []
+
+    def _reencode(label: str, raw: bytes, fmt: str) -> tuple[bytes, str]:
+        data, new_fmt, note = encode_webp(raw, fmt, webp, budget)
+        encoded.append((len(raw), len(data)))
+        log.info("  WebP %s: %.0f KB -> %.0f KB (%s)", label, len(raw) / 1024, len(data) / 1024, note)
+        return data, new_fmt
+    name_to_path = {}
+    if reencode and image_paths:
+        for p in image_paths:
+            name_to_path[os.path.splitext(os.path.basename(p))[0]] = p
+    if externalize_dir:
+        os.makedirs(externalize_dir, exist_ok=True)
+
+    n = len(markdown)
+    # Memoized next-occurrence positions keep repeated finds from rescanning
+    next_close = {"]": -2, ")": -2, ":": -2}
+
+    def _find(ch: str, pos: int) -> int:
+        cached = next_close[ch]
+        if cached == -1 or cached >= pos:
+            return cached
+        next_close[ch] = markdown.find(ch, pos)
+        return next_close[ch]
+
+    def _data_image(pos: int):
+        """Parse ![alt](data:image/fmt;base64,...) at pos -> (end, alt, fmt, b64) or None."""
+        close = _find("]", pos + 2)
+        if close < 0 or not markdown.startswith("(" + _DATA_PREFIX, close + 1):
+            return None
+        fmt_start = close + 2 + len(_DATA_PREFIX)
+        semi = markdown.find(";base64,", fmt_start, fmt_start + 32)
+        if semi < 0:
+            return None
+        b64_start = semi + len(";base64,")
+        end = _find(")", b64_start)
+        if end < 0 or _B64_RE.match(markdown, b64_start, end).end() != end:
+            return None
+        return end + 1, markdown[pos + 2:close], markdown[fmt_start:semi], markdown[b64_start:end]
+
+    def _slide_marker(pos: int):
+        """Parse *[Slide NAME: image with no extractable text]* at pos -> (end, name) or None."""
+        colon = _find(":", pos + 8)
+        if colon <= pos + 8 or not markdown.startswith(_SLIDE_SUFFIX, colon):
+            return None
+        return colon + len(_SLIDE_SUFFIX), markdown[pos + 8:colon]
+
+    def _emit_image(alt: str, img_bytes: bytes, ext: str) -> str:
+        if externalize_dir:
+            digest = hashlib.blake2b(img_bytes, digest_size=8).hexdigest()
+            fname = f"img_{digest}.{ext}"
+            fpath = os.path.join(externalize_dir, fname)
+            # Names are content hashes, so a file of the right size is this image;
+            # anything else is a leftover from an older interrupted run and is rewritten
+            if not os.path.isfile(fpath) or os.path.getsize(fpath) != len(img_bytes):
+                atomic_write_bytes(fpath, img_bytes)
+            rel = os.path.basename(externalize_dir) + "/" + fname
+            return "![" + alt + "](" + rel + ")"
+        return "![" + alt + "](data:image/" + ext + ";base64," + base64.b64encode(img_bytes).decode("ascii") + ")"
+
+    dropped = 0
+    last = 0
+    pos = 0
+    while pos < n:
+        m = _IMAGE_TOKEN_RE.search(markdown, pos)
+        if not m:
+            break
+        start = m.start()
+        replacement = None
+        if m.group(0) == "![":
+            parsed = _data_image(start)
+            if parsed:
+                end, alt, fmt, b64 = parsed
+                if strip:
+                    replacement = ""
+                elif drop_photos or externalize_dir or (reencode and fmt in _REENCODE_FORMATS):
+                    raw = base64.b64decode(b64)
+                    if drop_photos and classify_image(raw) == "photo":
+                        replacement = "<!-- image -->"
+                        dropped += 1
+                    else:
+                        if reencode and fmt in _REENCODE_FORMATS:
+                            raw, fmt = _reencode(f"image {len(encoded) + 1}", raw, fmt)
+                        replacement = _emit_image(alt, raw, fmt)
+        else:
+            parsed = _slide_marker(start)
+            if parsed and name_to_path:
+                end, name = parsed
+                stem = os.path.splitext(name)[0]
+                disk = name_to_path.get(stem)
+                if disk and os.path.isfile(disk):
+                    with open(disk, "rb") as fh:
+                        raw = fh.read()
+                    if drop_photos and classify_image(raw) == "photo":
+                        dropped += 1
+                    else:
+                        ext = os.path.splitext(disk)[1].lower().lstrip(".").replace("jpg", "jpeg")
+                        replacement = _emit_image(stem, *_reencode(os.path.basename(disk), raw, ext))
+                        log.info("  Embedded from disk: %s", os.path.basename(disk))
+        if replacement is None:
+            pos = start + 2
+            continue
+        sink.write(markdown[last:start])
+        sink.write(replacement)
+        last = pos = end
+    sink.write(markdown[last:])
+    if dropped:
+        log.info("  Skipped %d photo(s) (Embed Text Images mode)", dropped)
+    if encoded:
+        before, after = sum(b for b, _ in encoded), sum(a for _, a in encoded)
+        log.info("  WebP: %d image(s) %.0f KB -> %.0f KB (%.0f%% saved)",
+                 len(encoded), before / 1024, after / 1024, 100 * (1 - after / max(before, 1)))
+    return sink.getvalue() if out is None else None
+
+
+def _externalize_dir_for(output_md_path: str, image_mode: str) -> str | None:
+    """Sibling '<name>_images' folder when EXTERNALIZE_IMAGES is on for an embedding mode."""
+    if not EXTERNALIZE_IMAGES or image_mode not in ("embedded_text", "embedded_full"):
+        return None
+    return os.path.splitext(output_md_path)[0] + "_images"
+
 
 # ============================================================
 # GUI DIALOGS
@@ -260,30 +552,48 @@ def ask_image_mode_dialog() -> str:
 
 
 
+def _scan_pdfs_worker(folder_path: str, out: "queue.Queue", stop: threading.Event) -> None:
+    """Background os.scandir walk: pushes batches of (name, size_bytes), then None."""
+    batch: list[tuple[str, int]] = []
+    try:
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if stop.is_set():
+                    return
+                if not entry.name.lower().endswith(".pdf"):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                batch.append((entry.name, size))
+                if len(batch) >= 200:
+                    out.put(batch)
+                    batch = []
+    except OSError as e:
+        log.error("Could not scan folder %s: %s", folder_path, e)
+    if batch:
+        out.put(batch)
+    out.put(None)
+
+
 def select_pdfs_from_folder_dialog(folder_path: str) -> list[str]:
     """
-    Display a scrollable checklist of all PDFs found in folder_path.
-    User can select all, none, or individual files.
+    Display a checklist of all PDFs found in folder_path.
+    The window opens immediately: a background os.scandir worker streams
+    entries in, and a ttk.Treeview draws only the rows on screen, so folders
+    with tens of thousands of PDFs stay responsive. A filter box narrows the
+    list; Select All / None act on the rows currently shown.
     Returns a list of fully-qualified normalized paths for the selected PDFs.
     """
     folder_path = os.path.normpath(folder_path)
 
-    all_pdfs = sorted([
-        f for f in os.listdir(folder_path)
-        if f.lower().endswith(".pdf")
-    ])
-
-    if not all_pdfs:
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showinfo(
-            "No PDFs Found",
-            f"No PDF files were found in:\n{folder_path}"
-        )
-        root.destroy()
-        return []
-
     result = {"selected": []}
+    items: list[tuple[str, int]] = []      # (name, size) in scan order
+    checked: dict[str, bool] = {}
+    scan_queue: queue.Queue = queue.Queue()
+    stop_scan = threading.Event()
+    state = {"done": False, "shown": 0, "filter_job": None}
 
     root = tk.Tk()
     root.title("Select PDFs to Convert")
@@ -298,72 +608,132 @@ def select_pdfs_from_folder_dialog(folder_path: str) -> list[str]:
         header, text=f"📁  {os.path.basename(folder_path)}",
         font=("Segoe UI", 10, "bold"), bg="#2C3E50", fg="white"
     ).pack()
-    tk.Label(
-        header,
-        text=f"{len(all_pdfs)} PDF(s) found — check the files you want to convert",
+    count_label = tk.Label(
+        header, text="Scanning…",
         font=("Segoe UI", 9), bg="#2C3E50", fg="#BDC3C7"
-    ).pack()
-
-    # ── Select All / None ─────────────────────────────────────────────────
-    check_vars: list[tk.BooleanVar] = []
+    )
+    count_label.pack()
 
+    # ── Select All / None + Filter ────────────────────────────────────────
     ctrl_row = tk.Frame(root, pady=6)
     ctrl_row.pack(fill="x", padx=12)
 
-    def select_all():
-        for v in check_vars:
-            v.set(True)
+    def _mark(iid: str) -> str:
+        return "☑" if checked.get(iid) else "☐"
 
-    def select_none():
-        for v in check_vars:
-            v.set(False)
+    def set_visible(value: bool) -> None:
+        for iid in tree.get_children(""):
+            checked[iid] = value
+            tree.set(iid, "check", _mark(iid))
+        update_count()
 
     tk.Button(
-        ctrl_row, text="✅  Select All", command=select_all, width=13,
+        ctrl_row, text="✅  Select All", command=lambda: set_visible(True), width=13,
         bg="#5CB85C", fg="white", relief="flat", font=("Segoe UI", 9)
     ).pack(side="left", padx=4)
     tk.Button(
-        ctrl_row, text="❌  Select None", command=select_none, width=13,
+        ctrl_row, text="❌  Select None", command=lambda: set_visible(False), width=13,
         bg="#D9534F", fg="white", relief="flat", font=("Segoe UI", 9)
     ).pack(side="left", padx=4)
 
-    # ── Scrollable Checklist ──────────────────────────────────────────────
+    filter_var = tk.StringVar()
+    tk.Entry(ctrl_row, textvariable=filter_var, font=("Segoe UI", 9), width=22).pack(side="right", padx=4)
+    tk.Label(ctrl_row, text="Filter:", font=("Segoe UI", 9), fg="#555").pack(side="right")
+
+    # ── Virtualized Checklist ─────────────────────────────────────────────
     list_outer = tk.Frame(root, bd=1, relief="sunken")
     list_outer.pack(fill="both", expand=True, padx=12, pady=4)
 
-    canvas = tk.Canvas(list_outer, highlightthickness=0)
-    scrollbar = ttk.Scrollbar(list_outer, orient="vertical", command=canvas.yview)
-    inner = tk.Frame(canvas)
-
-    inner.bind(
-        "<Configure>",
-        lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-    )
-    canvas.create_window((0, 0), window=inner, anchor="nw")
-    canvas.configure(yscrollcommand=scrollbar.set)
+    tree = ttk.Treeview(list_outer, columns=("check", "name", "size"), show="headings", selectmode="extended")
+    tree.heading("check", text="✔")
+    tree.heading("name", text="File", anchor="w")
+    tree.heading("size", text="Size", anchor="e")
+    tree.column("check", width=36, stretch=False, anchor="center")
+    tree.column("name", width=420, anchor="w")
+    tree.column("size", width=90, stretch=False, anchor="e")
+    tree.tag_configure("odd", background="#F8F9FA")
+    scrollbar = ttk.Scrollbar(list_outer, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
     scrollbar.pack(side="right", fill="y")
-    canvas.pack(side="left", fill="both", expand=True)
+    tree.pack(side="left", fill="both", expand=True)
+
+    def _matches(name: str) -> bool:
+        needle = filter_var.get().strip().lower()
+        return not needle or needle in name.lower()
+
+    def _insert(name: str, size: int) -> None:
+        tag = "odd" if state["shown"] % 2 == 0 else ""
+        tree.insert("", "end", iid=name, values=(_mark(name), name, f"{size // 1024:,} KB"), tags=(tag,))
+        state["shown"] += 1
+
+    def refresh_view() -> None:
+        tree.delete(*tree.get_children(""))
+        state["shown"] = 0
+        for name, size in items:
+            if _matches(name):
+                _insert(name, size)
+        update_count()
+
+    def update_count() -> None:
+        n_sel = sum(1 for v in checked.values() if v)
+        suffix = "" if state["done"] else " (scanning…)"
+        count_label.config(
+            text=f"{len(items)} PDF(s) found{suffix} — {n_sel} selected, {state['shown']} shown"
+        )
 
-    canvas.bind_all(
-        "<MouseWheel>",
-        lambda e: canvas.yview_scroll(int(-1 * (e.delta / 120)), "units")
-    )
+    def toggle(iids) -> None:
+        for iid in iids:
+            checked[iid] = not checked.get(iid)
+            tree.set(iid, "check", _mark(iid))
+        update_count()
+
+    def on_click(event) -> None:
+        iid = tree.identify_row(event.y)
+        if iid and tree.identify_column(event.x) == "#1":
+            toggle([iid])
+
+    tree.bind("<Button-1>", on_click)
+    tree.bind("<space>", lambda e: toggle(tree.selection()))
 
-    for i, fname in enumerate(all_pdfs):
-        var = tk.BooleanVar(value=True)
-        check_vars.append(var)
-        bg = "#F8F9FA" if i % 2 == 0 else "#FFFFFF"
-        row_frame = tk.Frame(inner, bg=bg)
-        row_frame.pack(fill="x")
-        tk.Checkbutton(row_frame, variable=var, bg=bg, activebackground=bg).pack(side="left", padx=(6, 0))
-        tk.Label(
-            row_frame, text=fname, anchor="w", bg=bg, font=("Segoe UI", 9)
-        ).pack(side="left", fill="x", expand=True)
-        size_kb = os.path.getsize(os.path.join(folder_path, fname)) // 1024
-        tk.Label(
-            row_frame, text=f"{size_kb:,} KB", anchor="e",
-            bg=bg, fg="#888", font=("Segoe UI", 8)
-        ).pack(side="right", padx=8)
+    def schedule_refresh(*_) -> None:
+        # Rebuilding tens of thousands of rows per keystroke stalls typing:
+        # re-filter once the user pauses instead
+        if state["filter_job"]:
+            root.after_cancel(state["filter_job"])
+        state["filter_job"] = root.after(FILTER_DEBOUNCE_MS, run_refresh)
+
+    def run_refresh() -> None:
+        state["filter_job"] = None
+        refresh_view()
+
+    filter_var.trace_add("write", schedule_refresh)
+
+    def poll_scan() -> None:
+        added = 0
+        try:
+            while added < 2000:
+                batch = scan_queue.get_nowait()
+                if batch is None:
+                    state["done"] = True
+                    break
+                for name, size in batch:
+                    items.append((name, size))
+                    checked[name] = True
+                    if _matches(name):
+                        _insert(name, size)
+                added += len(batch)
+        except queue.Empty:
+            pass
+        if state["done"]:
+            if not items:
+                messagebox.showinfo("No PDFs Found", f"No PDF files were found in:\n{folder_path}")
+                root.destroy()
+                return
+            items.sort(key=lambda it: it[0].lower())
+            refresh_view()
+        else:
+            update_count()
+            root.after(50, poll_scan)
 
     # ── Footer ────────────────────────────────────────────────────────────
     foot = tk.Frame(root, pady=8)
@@ -371,9 +741,9 @@ def select_pdfs_from_folder_dialog(folder_path: str) -> list[str]:
 
     def on_ok():
         result["selected"] = [
-            os.path.normpath(os.path.join(folder_path, fname))
-            for fname, var in zip(all_pdfs, check_vars)
-            if var.get()
+            os.path.normpath(os.path.join(folder_path, name))
+            for name, _ in sorted(items, key=lambda it: it[0].lower())
+            if checked.get(name)
         ]
         if not result["selected"]:
             messagebox.showwarning("Nothing Selected", "Please select at least one PDF.")
@@ -389,7 +759,12 @@ def select_pdfs_from_folder_dialog(folder_path: str) -> list[str]:
         bg="#888", fg="white", width=10, font=("Segoe UI", 9), relief="flat"
     ).pack(side="right", padx=4)
 
+    threading.Thread(
+        target=_scan_pdfs_worker, args=(folder_path, scan_queue, stop_scan), daemon=True
+    ).start()
+    root.after(50, poll_scan)
     root.mainloop()
+    stop_scan.set()
     return result["selected"]
 
 def ask_output_directory_dialog(parent_folder: str) -> str:
@@ -489,12 +864,14 @@ def ask_output_directory_dialog(parent_folder: str) -> str:
 
 def run_pull_script_and_get_port(
     ps1_path: str = "pull-updated.ps1",
-    timeout_sec: int = PS1_TIMEOUT_SEC
+    timeout_sec: int = PS1_TIMEOUT_SEC,
+    env: dict | None = None,
 ) -> int:
     """
     Run the PowerShell script via Popen and stream output line-by-line.
     Extracts the port as soon as it appears — does NOT wait for the script to finish,
     which prevents hanging when Docker runs in foreground/attached mode.
+    `env` replaces the script's environment (the tuner uses it to pass container settings).
     """
     log.info("=" * 70)
     log.info("[STEP 1] Starting Docling Serve via PowerShell")
@@ -507,6 +884,7 @@ def run_pull_script_and_get_port(
             stderr=subprocess.STDOUT,
             text=True,
             bufsize=1,
+            env=env,
         )
     except Exception as e:
         log.error("Failed to launch PowerShell script: %s", e)
@@ -577,35 +955,134 @@ def wait_for_docling(
     return False
 
 
-def prepare_single_file_directories(pdf_path: str) -> tuple[str, str, str]:
-    """Stage a PDF into documents/ and prepare the outputs/ folder (single-file mode)."""
-    log.info("[STEP] Preparing directories")
-    base_name = os.path.basename(pdf_path)
+def tidy_legacy_staging(cleanup: bool = False) -> None:
+    """
+    Older versions copied every single-file PDF into ./documents before
+    uploading. Uploads now read the source file directly, so anything left
+    there is a stale copy: delete it with --cleanup, otherwise just report it.
+    """
     docs_dir = os.path.join(os.getcwd(), "documents")
-    out_dir = os.path.join(os.getcwd(), "outputs")
-
-    os.makedirs(docs_dir, exist_ok=True)
-    os.makedirs(out_dir, exist_ok=True)
-
-    dest_pdf = os.path.join(docs_dir, base_name)
-    if os.path.abspath(pdf_path) != os.path.abspath(dest_pdf):
-        shutil.copy(pdf_path, dest_pdf)
-        log.info("Staged PDF to %s", docs_dir)
-
-    return base_name, os.path.abspath(docs_dir), os.path.abspath(out_dir)
+    try:
+        stale = [e for e in os.scandir(docs_dir) if e.is_file() and e.name.lower().endswith(".pdf")]
+    except OSError:
+        return
+    if not stale:
+        return
+    total_mb = sum(e.stat().st_size for e in stale) / (1024 * 1024)
+    if not cleanup:
+        log.info("[CLEANUP] %d stale staged PDF copy(ies) (%.1f MB) in %s are no longer used — "
+                 "run with --cleanup to delete them.", len(stale), total_mb, docs_dir)
+        return
+    removed = 0
+    for entry in stale:
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            log.warning("Could not remove staged copy %s: %s", entry.name, e)
+    log.info("[CLEANUP] Removed %d stale staged PDF copy(ies) (%.1f MB) from %s", removed, total_mb, docs_dir)
+    try:
+        os.rmdir(docs_dir)   # only succeeds if nothing else lives there
+    except OSError:
+        pass
 
 
 def send_pdf_to_docling(
     api_base_url: str,
     pdf_path: str,
     output_dir: str,
-    cleanup: bool = False,
     image_mode: str = "strip",
+    progress: "BatchProgress | None" = None,
+    keep_json: bool = KEEP_DOCLING_JSON,
+    profile: dict | None = None,
+    extras: bool = True,
+    admission: "AdmissionController | None" = None,
 ) -> str | None:
     """
     POST a PDF to Docling's /v1/convert/file endpoint, extract the Markdown
     from the JSON response, and write a .md file to output_dir.
-    Returns the output path on success, or None on failure.
+    Docling options and WebP settings come from the conversion profile
+    (default: DOCLING_PROFILE).
+    When a BatchProgress is supplied, the batch ETA line replaces the spinner.
+    With keep_json, Docling's JSON document (images included) is also stored
+    as <name>.docling.json.gz so other image modes can be rendered locally.
+    extras=False skips the search index and chunk export (scratch outputs).
+    `admission` is the caller's AdmissionController; a timeout shrinks its budget.
+    Returns the output path on success, or None on failure (post-processing
+    and write errors included).
+    Raises ContainerDownError if the container fails its health check after
+    a failed attempt, so the caller can restart it and requeue the file.
+    """
+    profile = profile or resolve_profile(DOCLING_PROFILE)
+    document = request_pdf_conversion(api_base_url, pdf_path, image_mode, progress, keep_json, profile,
+                                      admission=admission)
+    if document is None:
+        return None
+    output_md_path = pdf_output_path(pdf_path, output_dir)
+    # A bad response (e.g. an undecodable image) fails this file, not the caller's whole run
+    try:
+        markdown = postprocess_pdf_markdown(document, output_md_path, image_mode, profile)
+    except Exception as e:
+        log.error("Post-processing failed for %s: %s", os.path.basename(pdf_path), e)
+        return None
+    try:
+        return write_pdf_outputs(output_md_path, markdown, document, keep_json,
+                                 source=os.path.abspath(pdf_path),
+                                 meta={"image_mode": image_mode, "profile": profile["name"]},
+                                 extras=extras)
+    except OSError as e:
+        log.error("Could not write output for %s: %s", os.path.basename(pdf_path), e)
+        return None
+
+
+def pdf_output_path(pdf_path: str, output_dir: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(pdf_path))[0] + ".md")
+
+
+def postprocess_pdf_markdown(document: dict, output_md_path: str, image_mode: str, profile: dict) -> str:
+    """CPU stage: strip, classify, externalize or re-encode the images in Docling's Markdown."""
+    # Belt-and-suspenders: strip mode also scrubs any base64 that leaked through
+    return postprocess_markdown(
+        document["md_content"],
+        strip=(image_mode == "strip"),
+        externalize_dir=_externalize_dir_for(output_md_path, image_mode),
+        drop_photos=(image_mode == "embedded_text"),
+        webp=profile["webp"],
+    )
+
+
+def write_pdf_outputs(output_md_path: str, markdown: str, document: dict, keep_json: bool,
+                      source: str = "", meta: dict | None = None, extras: bool = True) -> str:
+    """
+    I/O stage: write the .md atomically (and the cached JSON with keep_json),
+    then, with extras, index it (and export chunks with CHUNK_EXPORT);
+    returns the .md path.
+    """
+    if keep_json and document.get("json_content"):
+        save_docling_json(output_md_path, document["json_content"])
+    os.makedirs(os.path.dirname(output_md_path), exist_ok=True)
+    atomic_write_text(output_md_path, markdown)
+    log.info("✅ Saved: %s", output_md_path)
+    if extras:
+        save_output_extras(output_md_path, markdown, source=source, meta=meta,
+                           json_content=document.get("json_content"))
+    return output_md_path
+
+
+def request_pdf_conversion(
+    api_base_url: str,
+    pdf_path: str,
+    image_mode: str,
+    progress: "BatchProgress | None",
+    keep_json: bool,
+    profile: dict,
+    admission: "AdmissionController | None" = None,
+) -> dict | None:
+    """
+    Network stage of send_pdf_to_docling: upload the PDF (with retries and a
+    health check after each failed attempt) and return Docling's `document`
+    object, which holds at least `md_content`. Returns None on failure.
+    Raises ContainerDownError when the container stops answering.
     """
     if not os.path.isfile(pdf_path):
         log.error("File not found, skipping: %s", pdf_path)
@@ -620,32 +1097,99 @@ def send_pdf_to_docling(
     else:
         log.info("  File: %s  (%.1f MB)", os.path.basename(pdf_path), size_mb)
 
-    url = f"{api_base_url.rstrip('/')}/v1/convert/file"
-    base_name = os.path.basename(pdf_path)
-    output_md_path = os.path.join(output_dir, os.path.splitext(base_name)[0] + ".md")
+    data = build_convert_options(image_mode, profile, keep_json=keep_json, **ocr_options_for(pdf_path))
 
-    # Map your internal label to what the Docling API actually accepts
-    if image_mode == "strip":
-        api_image_mode = "placeholder"
-    elif image_mode == "placeholder":
-        api_image_mode = "placeholder"
-    else:
-        api_image_mode = "embedded"
+    def parse(response: requests.Response) -> dict | None:
+        resp_data = response.json()
 
+        status = resp_data.get("status", "unknown")
+        errors = resp_data.get("errors", [])
+        if errors:
+            for err in errors:
+                log.warning("Docling warning: %s", err)
+        if status == "failure":
+            log.error("Docling reported failure: %s", errors)
+            return None
+
+        document = resp_data.get("document") or {}
+        if document.get("md_content"):
+            return document
+        else:
+            log.error("No Markdown content in API response.")
+            log.debug("Full response: %s", resp_data)
+            return None
+
+    return _post_pdfs(api_base_url, [pdf_path], data, progress, parse, admission)
+
+
+def request_pdf_pack(
+    api_base_url: str,
+    pdf_paths: list[str],
+    image_mode: str,
+    progress: "BatchProgress | None",
+    keep_json: bool,
+    profile: dict,
+    ocr_options: dict,
+    admission: "AdmissionController | None" = None,
+) -> dict[str, dict] | None:
+    """
+    Convert several small PDFs in one request. Docling answers with a ZIP
+    holding <stem>.md (and <stem>.json with keep_json) per document; these are
+    split back into one `document` object per input path. Inputs missing from
+    the archive are simply absent from the result. Returns None if the
+    request itself failed; raises ContainerDownError like request_pdf_conversion.
+    """
+    data = build_convert_options(image_mode, profile, keep_json=keep_json, **ocr_options)
+    by_stem = {os.path.splitext(os.path.basename(p))[0]: p for p in pdf_paths}
+
+    def parse(response: requests.Response) -> dict[str, dict]:
+        if "zip" not in response.headers.get("Content-Type", "") and response.content[:2] != b"PK":
+            document = response.json().get("document") or {}   # a pack of one comes back as JSON
+            return {pdf_paths[0]: document} if len(pdf_paths) == 1 and document.get("md_content") else {}
+        documents: dict[str, dict] = {}
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            for name in zf.namelist():
+                stem, ext = os.path.splitext(os.path.basename(name))
+                path = by_stem.get(stem)
+                if path is None or ext not in (".md", ".json"):
+                    continue
+                raw = zf.read(name).decode("utf-8", errors="replace")
+                if ext == ".md":
+                    documents.setdefault(path, {})["md_content"] = raw
+                else:
+                    documents.setdefault(path, {})["json_content"] = json.loads(raw)
+        return {p: d for p, d in documents.items() if d.get("md_content")}
+
+    return _post_pdfs(api_base_url, pdf_paths, data, progress, parse, admission)
+
+
+def _post_pdfs(
+    api_base_url: str,
+    pdf_paths: list[str],
+    data: dict,
+    progress: "BatchProgress | None",
+    parse,
+    admission: "AdmissionController | None" = None,
+):
+    """
+    POST PDFs to /v1/convert/file and return parse(response) for the first
+    HTTP 200 (an exception from parse counts as a failed attempt). Retries up
+    to MAX_RETRIES, checking container health after every failed attempt.
+    A timeout shrinks `admission`, the controller the caller admitted the
+    request on (held directly: after a restart its URL is no longer this one).
+    Returns None if every attempt failed. Raises ContainerDownError.
+    """
+    url = f"{api_base_url.rstrip('/')}/v1/convert/file"
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            with open(pdf_path, "rb") as f:
-                files = {"files": (base_name, f, "application/pdf")}
-                data = {
-                    "to_formats": "md",
-                    "image_export_mode": api_image_mode,
-                    "include_images": "true" if image_mode in ("embedded_text", "embedded_full") else "false",
-                    "images_scale": "2" if image_mode == "embedded_full" else "1",
-                    "table_mode": "fast",
-                    "abort_on_error": "false",
-                }
-
+            file_handles = []
+            try:
+                files = []
+                for path in pdf_paths:
+                    fh = open(path, "rb")
+                    file_handles.append(fh)
+                    files.append(("files", (os.path.basename(path), fh, "application/pdf")))
 
                 stop_spinner = threading.Event()
 
@@ -662,7 +1206,8 @@ def send_pdf_to_docling(
                         time.sleep(0.3)
 
                 t = threading.Thread(target=spinner, daemon=True)
-                t.start()
+                if progress is None:
+                    t.start()
                 try:
                     response = requests.post(
                         url, files=files, data=data,
@@ -671,52 +1216,19 @@ def send_pdf_to_docling(
                     )
                 finally:
                     stop_spinner.set()
-                    t.join(timeout=1)
-                    print()   # newline after spinner
+                    if progress is None:
+                        t.join(timeout=1)
+                        print()   # newline after spinner
+            finally:
+                for fh in file_handles:
+                    fh.close()
 
-                log.info("DEBUG sent data: %s", data)
-                log.info("DEBUG HTTP status: %s | content-type: %s",
-                     response.status_code, response.headers.get("Content-Type", "?"))
+            log.info("DEBUG sent data: %s", data)
+            log.info("DEBUG HTTP status: %s | content-type: %s",
+                 response.status_code, response.headers.get("Content-Type", "?"))
 
             if response.status_code == 200:
-                resp_data = response.json()
-
-                status = resp_data.get("status", "unknown")
-                errors = resp_data.get("errors", [])
-                if errors:
-                    for err in errors:
-                        log.warning("Docling warning: %s", err)
-                if status == "failure":
-                    log.error("Docling reported failure: %s", errors)
-                    return None
-
-                markdown_content = resp_data.get("document", {}).get("md_content", "")
-                if markdown_content:
-                    # Belt-and-suspenders: scrub any base64 that leaked through
-                    if image_mode == "strip":
-                        markdown_content = re.sub(
-                            r'!\[.*?\]\(data:image\/[^;]+;base64,[A-Za-z0-9+/=]+\)',  # FIX: was over-escaped
-                            '',
-                            markdown_content
-                        )
-                    markdown_content = recompress_to_webp(markdown_content)
-                    os.makedirs(output_dir, exist_ok=True)
-                    with open(output_md_path, "w", encoding="utf-8") as md_f:
-                        md_f.write(markdown_content)
-                    log.info("✅ Saved: %s", output_md_path)
-
-                    if cleanup:
-                        try:
-                            os.remove(pdf_path)
-                            log.info("Cleaned up temp copy: %s", pdf_path)
-                        except OSError as e:
-                            log.warning("Could not remove temp file: %s", e)
-
-                    return output_md_path
-                else:
-                    log.error("No Markdown content in API response.")
-                    log.debug("Full response: %s", resp_data)
-                    return None
+                return parse(response)
 
             else:
                 log.error(
@@ -726,68 +1238,88 @@ def send_pdf_to_docling(
 
         except Exception as e:
             log.error("Attempt %d/%d — Exception: %s", attempt, MAX_RETRIES, e)
+            if admission is not None and isinstance(e, requests.Timeout):
+                admission.shrink("request timed out")
 
         if attempt < MAX_RETRIES:
             log.info("Retrying in 5 seconds...")
             time.sleep(5)
-            # FIX: health check before retry — detect container crash immediately
-            try:
-                health = requests.get(
-                    f"{api_base_url}/health",
-                    timeout=3,
-                    proxies={"http": None, "https": None}
-                )
-                if health.status_code != 200:
-                    log.error("❌ Container health check failed before retry — container may have crashed.")
-                    log.error("   Restart Docker or re-run the program to restart the container.")
-                    return None
-            except requests.ConnectionError:
-                log.error("❌ Container is unreachable before retry — it has likely crashed.")
-                log.error("   Restart Docker or re-run the program to restart the container.")
-                return None
+        # FIX: health check after a failed attempt — detect container crash immediately
+        try:
+            health = requests.get(
+                f"{api_base_url}/health",
+                timeout=3,
+                proxies={"http": None, "https": None}
+            )
+            if health.status_code != 200:
+                log.error("❌ Container health check failed after attempt %d — container may have crashed.", attempt)
+                raise ContainerDownError(f"health check returned HTTP {health.status_code}")
+        except requests.ConnectionError as e:
+            log.error("❌ Container is unreachable after attempt %d — it has likely crashed.", attempt)
+            raise ContainerDownError("container unreachable") from e
+        if attempt < MAX_RETRIES:
             log.info("  [Health] Container still alive, proceeding with retry %d...", attempt + 1)
 
     return None
 
 
+def _combine_slides(slides: dict[str, str], image_paths: list[str], dup_of: dict[str, str]) -> str:
+    """
+    Join per-slide Markdown (keyed by ZIP member name) in slide order, putting
+    a reference to the repeated slide wherever a near-duplicate was skipped.
+    Members that match no input file are appended in name order.
+    """
+    by_stem = {os.path.splitext(os.path.basename(name))[0]: name for name in slides}
+    combined_md = []
+    for path in sorted(image_paths):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if path in dup_of:
+            combined_md.append("<!-- " + stem + ".md -->\n*[Slide " + os.path.basename(path)
+                               + ": same as slide " + os.path.basename(dup_of[path]) + "]*")
+        elif stem in by_stem:
+            name = by_stem.pop(stem)
+            combined_md.append("<!-- " + name + " -->\n" + slides[name])
+    for name in sorted(by_stem.values()):
+        combined_md.append("<!-- " + name + " -->\n" + slides[name])
+    return "\n\n---\n\n".join(combined_md)
+
+
 def send_images_to_docling(
     api_base_url: str,
     image_paths: list[str],
     output_dir: str,
     output_name: str,
     image_mode: str = "embedded_full",
+    profile: dict | None = None,
+    progress: "BatchProgress | None" = None,
+    admission: "AdmissionController | None" = None,
 ) -> str | None:
     """
     POST multiple JPEG/PNG files to Docling in a single request.
     Returns one combined .md file with all slides in order.
+    Near-duplicate slides are not sent; each gets a reference to the slide it
+    repeats instead. When a BatchProgress is supplied, its ETA line replaces
+    the spinner. A timeout shrinks the caller's `admission` budget.
     """
     url = f"{api_base_url.rstrip('/')}/v1/convert/file"
     output_md_path = os.path.join(output_dir, output_name + ".md")
 
-    if image_mode in ("strip", "placeholder"):
-        api_image_mode = "placeholder"
-    else:
-        api_image_mode = "embedded"
-
-    data = {
-        "to_formats": "md",
-        "target_type": "inbody",
-        "image_export_mode": api_image_mode,
-        "include_images": "true" if image_mode in ("embedded_text", "embedded_full") else "false",
-        "images_scale": "2" if image_mode == "embedded_full" else "1",
-        "table_mode": "fast",
-        "abort_on_error": "false",
-        "force_ocr": "true",
-    }
+    profile = profile or resolve_profile(DOCLING_PROFILE)
+    data = build_convert_options(image_mode, profile, target_type="inbody", force_ocr="true")
 
+    dup_of = find_duplicate_slides(image_paths)
+    send_paths = [p for p in sorted(image_paths) if p not in dup_of]
+    if dup_of:
+        saved_mb = sum(os.path.getsize(p) for p in dup_of) / (1024 * 1024)
+        log.info("[DEDUP] %d near-duplicate slide(s) skipped (%.1f MB not uploaded)", len(dup_of), saved_mb)
 
-    log.info("[BATCH] Sending %d image(s) to Docling as one document...", len(image_paths))
+    log.info("[BATCH] Sending %d image(s) to Docling as one document...", len(send_paths))
 
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             file_handles = []
             files = []
-            for path in sorted(image_paths):
+            for path in send_paths:
                 ext = os.path.splitext(path)[1].lower()
                 mime = "image/png" if ext == ".png" else "image/jpeg"
                 fh = open(path, "rb")
@@ -805,7 +1337,8 @@ def send_images_to_docling(
                     time.sleep(0.3)
 
             t = threading.Thread(target=spinner, daemon=True)
-            t.start()
+            if progress is None:
+                t.start()
 
             try:
                 response = requests.post(
@@ -815,8 +1348,9 @@ def send_images_to_docling(
                 )
             finally:
                 stop_spinner.set()
-                t.join(timeout=1)
-                print(file=sys.stderr)
+                if progress is None:
+                    t.join(timeout=1)
+                    print(file=sys.stderr)
                 for fh in file_handles:
                     fh.close()
 
@@ -829,28 +1363,39 @@ def send_images_to_docling(
                 content_type = response.headers.get("Content-Type", "")
 
                 if "zip" in content_type or response.content[:2] == b"PK":
-                    combined_md = []
+                    slides = {}
                     with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
                         for name in sorted(zf.namelist()):
                             if name.endswith(".md"):
                                 text = zf.read(name).decode("utf-8", errors="replace").strip()
                                 if not text or text in ["{", "}", "{}", "{ }"]:
                                     text = "*[Slide " + name + ": image with no extractable text]*"
-                                combined_md.append("<!-- " + name + " -->\n" + text)
-                    markdown_content = "\n\n---\n\n".join(combined_md)
+                                slides[name] = text
+                    markdown_content = _combine_slides(slides, image_paths, dup_of)
                 else:
                     resp_data = response.json()
                     if resp_data.get("status") == "failure":
                         log.error("Docling reported failure: %s", resp_data.get("errors"))
                         return None
                     markdown_content = resp_data.get("document", {}).get("md_content", "")
+                    if dup_of and markdown_content and len(send_paths) == 1:
+                        name = os.path.splitext(os.path.basename(send_paths[0]))[0] + ".md"
+                        markdown_content = _combine_slides({name: markdown_content.strip()}, image_paths, dup_of)
 
                 if markdown_content:
-                    markdown_content = recompress_to_webp(markdown_content, image_paths)
+                    markdown_content = postprocess_markdown(
+                        markdown_content,
+                        image_paths=image_paths,
+                        externalize_dir=_externalize_dir_for(output_md_path, image_mode),
+                        drop_photos=(image_mode == "embedded_text"),
+                        webp=profile["webp"],
+                    )
                     os.makedirs(output_dir, exist_ok=True)
-                    with open(output_md_path, "w", encoding="utf-8") as md_f:
-                        md_f.write(markdown_content)
+                    atomic_write_text(output_md_path, markdown_content)
                     log.info("✅ Saved: %s", output_md_path)
+                    save_output_extras(output_md_path, markdown_content,
+                                       source=os.path.dirname(os.path.abspath(sorted(image_paths)[0])),
+                                       meta={"image_mode": image_mode, "profile": profile["name"]})
                     return output_md_path
 
                 log.error("No Markdown content in response.")
@@ -862,6 +1407,8 @@ def send_images_to_docling(
 
         except Exception as e:
             log.error("Attempt %d/%d — Exception: %s", attempt, MAX_RETRIES, e)
+            if admission is not None and isinstance(e, requests.Timeout):
+                admission.shrink("request timed out")
             if attempt < MAX_RETRIES:
                 time.sleep(5)
 
@@ -869,105 +1416,2632 @@ def send_images_to_docling(
 
 
 # ============================================================
-# CLI ARGUMENT PARSER
+# CONVERSION PROFILES
 # ============================================================
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docling_profiles.json")
+FOLDER_PROFILE_FILE = ".docling_profile"   # one line with a profile name, placed in an input folder
+
+# Each profile maps to Docling form fields (applied over the image-mode defaults)
+# and WebP settings (applied over the .env values). docling_profiles.json can
+# add profiles or override keys of these.
+BUILTIN_PROFILES = {
+    "draft": {
+        "description": "Fastest — no table structure, small low-effort WebP",
+        "docling": {"table_mode": "fast", "do_table_structure": "false", "images_scale": "1"},
+        "webp": {"quality": 50, "method": 2, "max_width": 1280, "max_height": 720},
+    },
+    "rag": {
+        "description": "Balanced default for AnythingLLM ingestion",
+        "docling": {"table_mode": "fast"},
+        "webp": {},
+    },
+    "archival": {
+        "description": "Highest fidelity — accurate tables, 2x images, high-quality WebP",
+        "docling": {"table_mode": "accurate", "images_scale": "2"},
+        "webp": {"quality": 80, "method": 6, "max_width": 0, "max_height": 0},
+    },
+}
+
+
+def load_profiles() -> dict:
+    """Built-in profiles merged with docling_profiles.json (if present)."""
+    profiles = {name: {k: (dict(v) if isinstance(v, dict) else v) for k, v in p.items()}
+                for name, p in BUILTIN_PROFILES.items()}
+    try:
+        with open(PROFILES_PATH, "r", encoding="utf-8") as fh:
+            custom = json.load(fh)
+    except OSError:
+        return profiles
+    except ValueError as e:
+        log.warning("Ignoring invalid %s: %s", os.path.basename(PROFILES_PATH), e)
+        return profiles
+    for name, spec in custom.items():
+        if name.startswith("_") or not isinstance(spec, dict):
+            continue   # comments / malformed entries
+        merged = profiles.setdefault(name, {"description": "", "docling": {}, "webp": {}})
+        merged["description"] = spec.get("description", merged["description"])
+        merged["docling"].update({k: str(v).lower() if isinstance(v, bool) else str(v)
+                                  for k, v in spec.get("docling", {}).items()})
+        merged["webp"].update(spec.get("webp", {}))
+    return profiles
+
+
+def resolve_profile(name: str) -> dict:
+    """Return {'name', 'description', 'docling', 'webp'} for a profile name, falling back to 'rag'."""
+    profiles = load_profiles()
+    if name not in profiles:
+        log.warning("Unknown profile '%s' — using 'rag'. Known: %s", name, ", ".join(profiles))
+        name = "rag"
+    spec = profiles[name]
+    return {
+        "name": name,
+        "description": spec.get("description", ""),
+        "docling": dict(spec.get("docling", {})),
+        "webp": {**webp_defaults(), **spec.get("webp", {})},
+    }
 
-def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description="Docling PDF-to-Markdown converter for AnythingLLM"
-    )
-    parser.add_argument(
-        "--input", nargs="+", metavar="PDF",
-        help="Path(s) to PDF file(s); bypasses GUI dialogs"
-    )
-    parser.add_argument(
-        "--ps1", default="pull-updated.ps1",
-        help="PowerShell script to start the Docker container (default: pull-updated.ps1)"
-    )
-    parser.add_argument(
-        "--cleanup", action="store_true",
-        help="Delete temporary PDF copies from documents/ after successful conversion"
-    )
-    parser.add_argument(
-        "--no-docker", action="store_true",
-        help="Skip PowerShell/Docker startup and connect to an already-running server"
-    )
-    parser.add_argument(
-        "--port", type=int, default=0,
-        help="Port to use when --no-docker is set"
-    )
-    return parser.parse_args()
 
+def folder_profile_name(folder: str) -> str | None:
+    """Profile name from a .docling_profile file in `folder`, if any."""
+    try:
+        with open(os.path.join(folder, FOLDER_PROFILE_FILE), "r", encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except OSError:
+        return None
 
-# ============================================================
-# MAIN
-# ============================================================
 
-def main() -> None:
-    args = parse_args()
+def choose_profile(cli_name: str | None, folder: str | None) -> dict:
+    """Per-run choice (--profile) beats a per-folder .docling_profile, which beats DOCLING_PROFILE."""
+    name = cli_name or (folder_profile_name(folder) if folder else None) or DOCLING_PROFILE
+    profile = resolve_profile(name)
+    log.info("Profile: %s — %s", profile["name"], profile["description"])
+    return profile
+
+
+def build_convert_options(
+    image_mode: str,
+    profile: dict,
+    keep_json: bool = False,
+    **overrides: str,
+) -> dict:
+    """
+    Form fields for /v1/convert/file. Layering: image-mode defaults, then
+    per-request overrides (OCR pre-flight, slide settings), then the profile.
+    keep_json forces what the cached JSON needs to re-render every image mode.
+    """
+    # Map your internal label to what the Docling API actually accepts
+    api_image_mode = "placeholder" if image_mode in ("strip", "placeholder") else "embedded"
+    data = {
+        "to_formats": "md",
+        "image_export_mode": api_image_mode,
+        "include_images": "true" if image_mode in ("embedded_text", "embedded_full") else "false",
+        "images_scale": "2" if image_mode == "embedded_full" else "1",
+        "table_mode": "fast",
+        "abort_on_error": "false",
+    }
+    data.update(overrides)
+    data.update(profile["docling"])
+    if keep_json:
+        data.update({"to_formats": ["md", "json"], "include_images": "true", "images_scale": "2"})
+    return data
+
+
+def benchmark_profiles(
+    supervisor: "ContainerSupervisor",
+    sample_dir: str,
+    image_mode: str,
+    names: list[str] | None = None,
+) -> list[dict]:
+    """
+    Convert every PDF in sample_dir once per profile into a scratch folder and
+    report seconds per page and total output size, so profiles can be chosen
+    on measured numbers rather than guesses.
+    """
+    pdfs = sorted(
+        os.path.join(sample_dir, f) for f in os.listdir(sample_dir)
+        if f.lower().endswith(".pdf")
+    )
+    if not pdfs:
+        log.error("No PDFs found in sample folder: %s", sample_dir)
+        return []
+    pages = sum(estimate_pdf_pages(p) for p in pdfs)
+    rows = []
+    for name in names or list(load_profiles()):
+        profile = resolve_profile(name)
+        log.info("[BENCH] Profile '%s' on %d PDF(s), ~%d page(s)...", name, len(pdfs), pages)
+        scratch = tempfile.mkdtemp(prefix=f"docling_bench_{name}_")
+        ok = 0
+        t0 = time.time()
+        try:
+            for pdf in pdfs:
+                try:
+                    # Scratch outputs: no JSON cache, index or chunks — they would
+                    # skew output_kb and leave search hits for deleted files
+                    out = send_pdf_to_docling(supervisor.base_url, pdf, scratch, image_mode=image_mode,
+                                              keep_json=False, profile=profile, extras=False)
+                except ContainerDownError:
+                    if not supervisor.recover(supervisor.base_url):
+                        return rows
+                    out = None
+                ok += bool(out)
+            elapsed = time.time() - t0
+            out_bytes = sum(
+                os.path.getsize(os.path.join(dirpath, f))
+                for dirpath, _, files in os.walk(scratch) for f in files
+            )
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        rows.append({
+            "profile": name, "ok": ok, "files": len(pdfs), "pages": pages,
+            "seconds": elapsed, "sec_per_page": elapsed / max(pages, 1), "output_kb": out_bytes / 1024,
+        })
 
     print("\n" + "=" * 70)
-    print("  DOCLING TO MARKDOWN CONVERTER FOR ANYTHINGLLM")
+    print(f"  PROFILE BENCHMARK — {len(pdfs)} PDF(s), ~{pages} page(s), image mode '{image_mode}'")
     print("=" * 70)
+    print(f"  {'profile':<12}{'ok':>7}{'seconds':>10}{'s/page':>9}{'output KB':>12}")
+    for r in rows:
+        print(f"  {r['profile']:<12}{str(r['ok']) + '/' + str(r['files']):>7}"
+              f"{r['seconds']:>10.1f}{r['sec_per_page']:>9.2f}{r['output_kb']:>12,.0f}")
+    print("=" * 70 + "\n")
+    return rows
 
-    # ── Start Docling once — stays running for all conversions ────────────
-    if args.no_docker:
-        if not args.port:
-            log.error("--no-docker requires --port to be specified.")
-            sys.exit(1)
-        port = args.port
-        log.info("Skipping Docker startup. Using port %d.", port)
-    else:
-        port = run_pull_script_and_get_port(args.ps1)
-        if not port:
-            sys.exit(1)
 
-    base_url = f"http://localhost:{port}"
-    if not wait_for_docling(base_url):
-        sys.exit(1)
+# ============================================================
+# OCR PRE-FLIGHT (scanned vs born-digital)
+# ============================================================
+logging.getLogger("pypdf").setLevel(logging.ERROR)
 
-    # ── Main loop — repeats until user chooses to quit ────────────────────
-    while True:
-        pdf_files: list[str] = []
-        output_dir: str = ""
-        use_staging = False
 
-        if args.input:
-            # CLI mode — skip all dialogs
-            pdf_files = args.input
-            output_dir = os.path.normpath(os.path.abspath(os.path.join(os.getcwd(), "outputs")))
-            os.makedirs(output_dir, exist_ok=True)
+def detect_text_layer(pdf_path: str) -> dict:
+    """
+    Inspect a PDF's own text layer page by page (pypdf, no rendering) and
+    classify it as 'digital', 'scanned' or 'mixed'. Documents longer than
+    OCR_PREFLIGHT_PAGES are sampled evenly (first and last page included);
+    since unread pages may be scans, a sample that finds only text pages is
+    'sampled_digital', not 'digital'. Returns {"kind", "pages", "checked",
+    "scanned_pages"}; kind is 'unknown' if the file cannot be read, leaving
+    OCR to the server default.
+    """
+    try:
+        from pypdf import PdfReader
+        reader = PdfReader(pdf_path)
+        total = len(reader.pages)
+    except Exception as e:
+        log.warning("  OCR pre-flight could not read %s: %s", os.path.basename(pdf_path), e)
+        return {"kind": "unknown", "pages": 0, "checked": 0, "scanned_pages": []}
+
+    n = min(total, OCR_PREFLIGHT_PAGES)
+    sample = sorted({round(i * (total - 1) / (n - 1)) for i in range(n)}) if n > 1 else list(range(n))
+    scanned: list[int] = []
+    checked = 0
+    for idx in sample:
+        checked += 1
+        try:
+            text = reader.pages[idx].extract_text() or ""
+        except Exception:
+            text = ""
+        if len(text.strip()) < OCR_MIN_TEXT_CHARS:
+            scanned.append(idx + 1)
+
+    if not checked or len(scanned) == checked:
+        kind = "scanned"
+    elif not scanned:
+        kind = "digital" if checked == total else "sampled_digital"
+    else:
+        kind = "mixed"
+    return {"kind": kind, "pages": total, "checked": checked, "scanned_pages": scanned}
 
-        else:
-            mode = ask_mode_dialog()
-            if not mode:
-                log.info("Cancelled by user — exiting.")
-                break   # exits the while loop cleanly
 
-            if mode == "file":
-                root = tk.Tk()
-                root.withdraw()
-                chosen = filedialog.askopenfilenames(
-                    title="Select PDF file(s) to convert",
-                    filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")]
-                )
-                root.destroy()
+def ocr_options_for(pdf_path: str) -> dict:
+    """
+    Docling OCR form fields for one PDF. Born-digital files skip OCR entirely;
+    scanned and mixed files keep it on (Docling only OCRs bitmap regions, so
+    text-layer pages of a mixed file stay cheap).
+    """
+    if not OCR_PREFLIGHT:
+        return {}
+    info = detect_text_layer(pdf_path)
+    if info["kind"] == "digital":
+        log.info("  OCR pre-flight: born-digital (%d page(s)) — OCR disabled", info["pages"])
+        return {"do_ocr": "false"}
+    if info["kind"] == "sampled_digital":
+        log.info("  OCR pre-flight: %d of %d page(s) checked, all with text — OCR kept on for the unchecked pages",
+                 info["checked"], info["pages"])
+        return {"do_ocr": "true"}
+    if info["kind"] == "scanned":
+        log.info("  OCR pre-flight: scanned (%d page(s)) — OCR enabled", info["pages"])
+        return {"do_ocr": "true"}
+    if info["kind"] == "mixed":
+        log.info("  OCR pre-flight: mixed — %d sampled page(s) without text (e.g. %s) — OCR enabled",
+                 len(info["scanned_pages"]), ", ".join(map(str, info["scanned_pages"][:8])))
+        return {"do_ocr": "true"}
+    return {}
 
-                if not chosen:
-                    log.error("No file selected — returning to menu.")
-                    continue   # back to top of loop, show mode dialog again
 
-                pdf_files = list(chosen)
-                use_staging = True
-                output_dir = os.path.normpath(os.path.abspath(
-                    SINGLE_PDF_OUTPUT_DIR if SINGLE_PDF_OUTPUT_DIR
-                    else os.path.join(os.getcwd(), "outputs")
-                ))
-                os.makedirs(output_dir, exist_ok=True)
+# ============================================================
+# NEAR-DUPLICATE SLIDES (perceptual hash)
+# ============================================================
+_DHASH_SIZE       = 16          # 16x16 difference hash = 256 bits, used to find candidate pairs
+DEDUP_HASH_BITS   = 24          # candidates differ in at most this many hash bits
+_DEDUP_THUMB      = (320, 180)  # candidates are confirmed tile by tile on this greyscale thumbnail
+_DEDUP_TILE       = 10          # tile edge in thumbnail pixels (about one line of slide text)
+_DEDUP_TILE_NOISE = 6           # mean grey-level difference a tile may show from recompression/scaling
 
-            elif mode == "folder":
-                root = tk.Tk()
-                root.withdraw()
+
+def slide_signature(img_bytes: bytes):
+    """
+    (dhash, thumbnail) for one slide, or None if the image cannot be decoded.
+    The 256-bit difference hash records whether each pixel of a 17x16
+    greyscale copy is brighter than its right-hand neighbour; it survives
+    recompression and scaling but is too coarse to see one added bullet,
+    so matches are confirmed on the thumbnail.
+    """
+    try:
+        import numpy as np
+        Image = _load_pil()
+        img = Image.open(io.BytesIO(img_bytes))
+        img.draft("L", (_DEDUP_THUMB[0] * 2, _DEDUP_THUMB[1] * 2))   # JPEG: decode at reduced scale
+        img = img.convert("L")
+        thumb = np.asarray(img.resize(_DEDUP_THUMB, Image.BILINEAR), dtype=np.int16)
+        small = np.asarray(img.resize((_DHASH_SIZE + 1, _DHASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    except Exception:
+        return None
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big"), thumb
+
+
+def _tile_similarity(a, b) -> float:
+    """Share of thumbnail tiles whose mean absolute difference is within capture noise."""
+    t = _DEDUP_TILE
+    h, w = a.shape[0] // t * t, a.shape[1] // t * t
+    diff = abs(a[:h, :w] - b[:h, :w]).reshape(h // t, t, w // t, t).mean(axis=(1, 3))
+    return float((diff <= _DEDUP_TILE_NOISE).mean())
+
+
+def find_duplicate_slides(image_paths: list[str], similarity: float = SLIDE_DEDUP_SIMILARITY) -> dict[str, str]:
+    """
+    Map each near-duplicate slide to the earlier slide it repeats, comparing
+    every slide (in name order) against all representatives kept so far, so
+    a title slide repeated later in the deck is caught too. Byte-identical
+    files always match; otherwise a close perceptual hash nominates a pair
+    and at least `similarity` of the thumbnail tiles must agree. The default
+    of 1.0 tolerates only recompression and scaling noise, so a build step
+    that adds a bullet is still converted. A similarity of 0 disables it.
+    """
+    if similarity <= 0:
+        return {}
+    reps: list[tuple[str, bytes, tuple | None]] = []
+    dup_of: dict[str, str] = {}
+    for path in sorted(image_paths):
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        digest = hashlib.blake2b(raw, digest_size=16).digest()
+        sig = slide_signature(raw)
+        for rep_path, rep_digest, rep_sig in reps:
+            if digest == rep_digest or (
+                sig is not None and rep_sig is not None
+                and (sig[0] ^ rep_sig[0]).bit_count() <= DEDUP_HASH_BITS
+                and _tile_similarity(sig[1], rep_sig[1]) >= similarity
+            ):
+                dup_of[path] = rep_path
+                break
+        else:
+            reps.append((path, digest, sig))
+    return dup_of
+
+
+# ============================================================
+# CONVERT ONCE, RENDER MANY (cached DoclingDocument JSON)
+# ============================================================
+DOCLING_JSON_SUFFIX = ".docling.json.gz"
+
+
+def docling_json_path(output_md_path: str) -> str:
+    return os.path.splitext(output_md_path)[0] + DOCLING_JSON_SUFFIX
+
+
+def save_docling_json(output_md_path: str, json_content: dict) -> str:
+    """Store Docling's JSON document gzip-compressed next to the .md file."""
+    path = docling_json_path(output_md_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = json.dumps(json_content, ensure_ascii=False).encode("utf-8")
+    atomic_write_bytes(path, gzip.compress(payload, compresslevel=6))
+    log.info("  Cached Docling JSON: %s", os.path.basename(path))
+    return path
+
+
+def render_markdown_from_json(json_path: str, image_mode: str, profile: dict | None = None) -> str | None:
+    """
+    Render Markdown for any image mode from a cached .docling.json.gz without
+    the container, then apply the same post-processing as a live conversion.
+    Writes <name>.md next to the cache and returns its path, or None on failure.
+    """
+    try:
+        from docling_core.types.doc import DoclingDocument, ImageRefMode
+    except ImportError:
+        log.error("docling-core is required to render from cached JSON (pip install docling-core).")
+        return None
+
+    try:
+        with gzip.open(json_path, "rt", encoding="utf-8") as fh:
+            doc = DoclingDocument.model_validate(json.load(fh))
+    except Exception as e:
+        log.error("Could not load cached document %s: %s", json_path, e)
+        return None
+
+    ref_mode = ImageRefMode.EMBEDDED if image_mode in ("embedded_text", "embedded_full") else ImageRefMode.PLACEHOLDER
+    markdown_content = doc.export_to_markdown(image_mode=ref_mode)
+    output_md_path = json_path[: -len(DOCLING_JSON_SUFFIX)] + ".md"
+    markdown_content = postprocess_markdown(
+        markdown_content,
+        strip=(image_mode == "strip"),
+        externalize_dir=_externalize_dir_for(output_md_path, image_mode),
+        drop_photos=(image_mode == "embedded_text"),
+        webp=(profile or resolve_profile(DOCLING_PROFILE))["webp"],
+    )
+    atomic_write_text(output_md_path, markdown_content)
+    log.info("✅ Rendered (%s): %s", image_mode, output_md_path)
+    save_output_extras(output_md_path, markdown_content,
+                       meta={"image_mode": image_mode, "profile": (profile or {}).get("name", DOCLING_PROFILE)})
+    return output_md_path
+
+
+def render_cached_documents(
+    target: str,
+    image_mode: str,
+    profile: dict | None = None,
+) -> tuple[list[str], list[str]]:
+    """Render every cached .docling.json.gz under `target` (file or folder)."""
+    if os.path.isfile(target):
+        caches = [target]
+    else:
+        caches = sorted(
+            os.path.join(dirpath, f)
+            for dirpath, _, files in os.walk(target)
+            for f in files if f.endswith(DOCLING_JSON_SUFFIX)
+        )
+    log.info("[RENDER] %d cached document(s) → image mode '%s'", len(caches), image_mode)
+    ok: list[str] = []
+    fail: list[str] = []
+    for path in caches:
+        out = render_markdown_from_json(path, image_mode, profile)
+        (ok if out else fail).append(out or path)
+    return ok, fail
+
+
+# ============================================================
+# FULL-TEXT SEARCH INDEX (SQLite FTS5)
+# ============================================================
+SEARCH_RESULTS = 20   # hits printed by --search
+
+_INDEX_DATA_URI_RE = re.compile(r"!\[[^\]\n]*\]\(data:image/[^)]*\)")
+_index_lock = threading.Lock()
+_index_disabled = False
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id        INTEGER PRIMARY KEY,
+    path      TEXT UNIQUE NOT NULL,
+    hash      TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    source    TEXT NOT NULL DEFAULT '',
+    image_mode TEXT NOT NULL DEFAULT '',
+    profile   TEXT NOT NULL DEFAULT '',
+    indexed   REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, body, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+
+def _open_index():
+    """Connection to the search index (schema created on first use), or None if FTS5 is unavailable."""
+    global _index_disabled
+    if _index_disabled:
+        return None
+    import sqlite3
+    try:
+        conn = sqlite3.connect(SEARCH_INDEX_PATH, timeout=30)
+        conn.executescript(_INDEX_SCHEMA)
+    except sqlite3.Error as e:
+        log.warning("Search index unavailable (%s) — outputs will not be indexed.", e)
+        _index_disabled = True
+        return None
+    return conn
+
+
+def index_text(markdown: str) -> str:
+    """Markdown with inline data-URI images removed — only text goes into the index."""
+    return _INDEX_DATA_URI_RE.sub("", markdown).replace("<!-- image -->", "")
+
+
+def index_markdown(md_path: str, markdown: str | None = None, source: str = "",
+                   meta: dict | None = None, conn=None) -> bool:
+    """
+    Add or refresh one .md file in the search index. A file whose size and
+    mtime match the index is skipped without being read; one whose content
+    hash matches only has its stat refreshed. Returns True if the text was
+    (re)indexed. Never raises: indexing must not fail a conversion.
+    """
+    if not SEARCH_INDEX and conn is None:
+        return False
+    md_path = os.path.abspath(md_path)
+    meta = meta or {}
+    own = conn is None
+    with _index_lock:
+        conn = conn or _open_index()
+        if conn is None:
+            return False
+        try:
+            st = os.stat(md_path)
+            row = conn.execute("SELECT id, hash, size, mtime_ns FROM docs WHERE path = ?", (md_path,)).fetchone()
+            if row and row[2] == st.st_size and row[3] == st.st_mtime_ns:
+                return False
+            if markdown is None:
+                with open(md_path, "r", encoding="utf-8", errors="replace") as fh:
+                    markdown = fh.read()
+            digest = hashlib.blake2b(markdown.encode("utf-8"), digest_size=16).hexdigest()
+            with conn:
+                if row and row[1] == digest:
+                    conn.execute("UPDATE docs SET size = ?, mtime_ns = ? WHERE id = ?",
+                                 (st.st_size, st.st_mtime_ns, row[0]))
+                    return False
+                values = (md_path, digest, st.st_size, st.st_mtime_ns, source,
+                          meta.get("image_mode", ""), meta.get("profile", ""), time.time())
+                if row:
+                    conn.execute("UPDATE docs SET path = ?, hash = ?, size = ?, mtime_ns = ?, source = ?, "
+                                 "image_mode = ?, profile = ?, indexed = ? WHERE id = ?", values + (row[0],))
+                    conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (row[0],))
+                    doc_id = row[0]
+                else:
+                    doc_id = conn.execute(
+                        "INSERT INTO docs (path, hash, size, mtime_ns, source, image_mode, profile, indexed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values).lastrowid
+                conn.execute("INSERT INTO docs_fts (rowid, title, body) VALUES (?, ?, ?)",
+                             (doc_id, os.path.splitext(os.path.basename(md_path))[0], index_text(markdown)))
+            return True
+        except Exception as e:
+            log.warning("Could not index %s: %s", os.path.basename(md_path), e)
+            return False
+        finally:
+            if own:
+                conn.close()
+
+
+def prune_index(folder: str, conn) -> int:
+    """Drop index entries under `folder` whose .md no longer exists (deleted or moved); returns how many."""
+    prefix = os.path.join(os.path.abspath(folder), "")
+    rows = conn.execute("SELECT id, path FROM docs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+    gone = [(doc_id,) for doc_id, path in rows if not os.path.isfile(path)]
+    if gone:
+        with _index_lock, conn:
+            conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", gone)
+            conn.executemany("DELETE FROM docs WHERE id = ?", gone)
+    return len(gone)
+
+
+def index_folder(target: str) -> tuple[int, int]:
+    """
+    Index every .md under `target` (file or folder), e.g. outputs from before
+    the index existed. Sources and conversion settings are taken from each
+    folder's resume journal when it has them. For a folder, entries under it
+    whose file was deleted or moved are removed. Returns (indexed, unchanged).
+    """
+    if os.path.isfile(target):
+        paths = [os.path.abspath(target)]
+    else:
+        paths = sorted(
+            os.path.join(dirpath, f)
+            for dirpath, _, files in os.walk(target)
+            for f in files if f.lower().endswith(".md")
+        )
+    conn = _open_index()
+    if conn is None:
+        return 0, 0
+    journals: dict[str, dict] = {}
+    indexed = 0
+    try:
+        for path in paths:
+            folder = os.path.dirname(path)
+            if folder not in journals:
+                journals[folder] = {os.path.abspath(r.get("output", "")): r for r in load_journal(folder).values()}
+            rec = journals[folder].get(os.path.abspath(path), {})
+            indexed += index_markdown(path, source=rec.get("input", ""), meta=rec, conn=conn)
+        removed = 0 if os.path.isfile(target) else prune_index(target, conn)
+    finally:
+        conn.close()
+    log.info("[INDEX] %d file(s) indexed, %d unchanged, %d missing file(s) removed — %s",
+             indexed, len(paths) - indexed, removed, SEARCH_INDEX_PATH)
+    return indexed, len(paths) - indexed
+
+
+def search_index(query: str, limit: int = SEARCH_RESULTS) -> list[dict]:
+    """FTS5 query (words, "phrases", AND/OR/NOT, prefix*) ranked by BM25, best first."""
+    conn = _open_index()
+    if conn is None:
+        return []
+    sql = ("SELECT d.path, d.source, d.image_mode, d.profile, "
+           "       snippet(docs_fts, 1, '[', ']', ' … ', 12) "
+           "FROM docs_fts JOIN docs d ON d.id = docs_fts.rowid "
+           "WHERE docs_fts MATCH ? ORDER BY bm25(docs_fts, 5.0, 1.0) LIMIT ?")
+    try:
+        try:
+            rows = conn.execute(sql, (query, limit)).fetchall()
+        except Exception:
+            # Not valid FTS5 syntax (e.g. "e-mail", "C++") — search it as one literal phrase
+            rows = conn.execute(sql, ('"' + query.replace('"', '""') + '"', limit)).fetchall()
+    except Exception as e:
+        log.error("Search failed: %s", e)
+        return []
+    finally:
+        conn.close()
+    return [{"path": r[0], "source": r[1], "image_mode": r[2], "profile": r[3], "snippet": r[4]} for r in rows]
+
+
+def print_search_results(query: str) -> None:
+    t0 = time.time()
+    hits = search_index(query)
+    print("\n" + "=" * 70)
+    print(f"  SEARCH: {query}  — {len(hits)} hit(s) in {(time.time() - t0) * 1000:.0f} ms")
+    print("=" * 70)
+    for h in hits:
+        print(f"\n  {h['path']}")
+        if h["source"]:
+            print(f"      source: {h['source']}  ({h['image_mode'] or '?'}, {h['profile'] or '?'})")
+        print("      " + " ".join(h["snippet"].split()))
+    print("\n" + "=" * 70 + "\n")
+
+
+# ============================================================
+# RAG CHUNK EXPORT (heading-aware, token-bounded JSONL)
+# ============================================================
+CHUNKS_SUFFIX = ".chunks.jsonl"
+_CHARS_PER_TOKEN = 4   # rough English average; keeps the chunker free of tokenizer dependencies
+
+# A heading line on its own, or a run of non-blank lines that contains no heading
+_BLOCK_RE = re.compile(r"^#{1,6}[ \t][^\n]*(?:\n|$)|(?:(?!#{1,6}[ \t])[^\n]*\S[^\n]*(?:\n|$))+", re.M)
+_HEADING_RE = re.compile(r"#{1,6}[ \t]+(.+)")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+def _split_oversized(text: str, max_tokens: int) -> list[str]:
+    """
+    Split one block that exceeds the budget: by lines (keeps table rows whole),
+    then sentences, then hard cuts. Pieces stay in reading order:
+
+    >>> _split_oversized("intro line\\n" + "x" * 50, 5)
+    ['intro line', 'xxxxxxxxxxxxxxxxxxxx', 'xxxxxxxxxxxxxxxxxxxx', 'xxxxxxxxxx']
+    """
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    pieces: list[str] = []
+    current = ""
+    for line in text.split("\n"):
+        parts = [line] if len(line) <= max_chars else _SENTENCE_END_RE.split(line)
+        for n, part in enumerate(parts):
+            if len(part) > max_chars:
+                # Hard cuts (long unpunctuated lines: CJK text, table rows, URLs)
+                # go after whatever is already collected
+                if current:
+                    pieces.append(current)
+                    current = ""
+                while len(part) > max_chars:
+                    pieces.append(part[:max_chars])
+                    part = part[max_chars:]
+            candidate = current + (" " if n else "\n") + part if current else part
+            if len(candidate) > max_chars and current:
+                pieces.append(current)
+                candidate = part
+            current = candidate
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def _page_offsets(markdown: str, json_content: dict | None) -> list[tuple[int, int]]:
+    """
+    (offset in markdown, page number) for the DoclingDocument's text items,
+    found in reading order. Items that cannot be located are skipped.
+    """
+    if not json_content:
+        return []
+    offsets = []
+    cursor = 0
+    for item in json_content.get("texts", []):
+        prov = item.get("prov") or []
+        snippet = " ".join((item.get("text") or "").split())[:60]
+        if not prov or len(snippet) < 8:
+            continue
+        pos = markdown.find(snippet, cursor)
+        if pos >= 0:
+            offsets.append((pos, prov[0].get("page_no")))
+            cursor = pos
+    return offsets
+
+
+def chunk_markdown(markdown: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                   json_content: dict | None = None) -> list[dict]:
+    """
+    Split Markdown into chunks that never cross a heading and stay within
+    max_tokens (estimated). Each chunk carries its heading path and, when
+    Docling's JSON document is available, the pages it covers. Inline
+    data-URI images are dropped from the text. Headings count wherever they
+    start a line, including directly above their text:
+
+    >>> [(c["headings"], c["text"]) for c in chunk_markdown("## A\\ntext a\\n## B\\ntext b", 50)]
+    [(['A'], 'text a'), (['B'], 'text b')]
+
+    Returns [{"headings", "text", "tokens", "pages"}].
+    """
+    page_marks = _page_offsets(markdown, json_content)
+    chunks: list[dict] = []
+    headings: list[tuple[int, str]] = []
+    current: list[str] = []
+    span = [0, 0]
+
+    def flush() -> None:
+        text = "\n\n".join(current).strip()
+        if text:
+            pages = sorted({p for pos, p in page_marks if span[0] <= pos < span[1] and p is not None})
+            chunks.append({"headings": [h for _, h in headings], "text": text,
+                           "tokens": estimate_tokens(text), "pages": pages})
+        current.clear()
+
+    for m in _BLOCK_RE.finditer(markdown):
+        block = index_text(m.group(0)).strip()
+        if not block:
+            continue
+        heading = _HEADING_RE.fullmatch(block)
+        if heading:
+            flush()
+            level = len(block) - len(block.lstrip("#"))
+            headings[:] = [h for h in headings if h[0] < level] + [(level, heading.group(1).strip())]
+            span[0] = m.start()
+            continue
+        if not current:
+            span[0] = m.start()
+        if sum(estimate_tokens(c) for c in current) + estimate_tokens(block) > max_tokens:
+            flush()
+            span[0] = m.start()
+        span[1] = m.end()
+        if estimate_tokens(block) > max_tokens:
+            for piece in _split_oversized(block, max_tokens):
+                current.append(piece)
+                flush()
+            continue
+        current.append(block)
+    flush()
+    return chunks
+
+
+def export_chunks(md_path: str, markdown: str | None = None, source: str = "",
+                  json_content: dict | None = None) -> str | None:
+    """
+    Write <name>.chunks.jsonl beside a .md: one JSON object per chunk with id,
+    source, document, chunk index, headings, pages, token estimate and text.
+    Uses the cached .docling.json.gz for page numbers when no JSON is given.
+    Returns the JSONL path, or None on failure. Never raises.
+    """
+    try:
+        if markdown is None:
+            with open(md_path, "r", encoding="utf-8", errors="replace") as fh:
+                markdown = fh.read()
+        if json_content is None and os.path.isfile(docling_json_path(md_path)):
+            with gzip.open(docling_json_path(md_path), "rt", encoding="utf-8") as fh:
+                json_content = json.load(fh)
+        stem = os.path.splitext(os.path.basename(md_path))[0]
+        lines = []
+        for i, chunk in enumerate(chunk_markdown(markdown, json_content=json_content)):
+            lines.append(json.dumps({
+                "id": f"{stem}-{i:04d}",
+                "source": source,
+                "document": os.path.abspath(md_path),
+                "chunk": i,
+                **chunk,
+            }, ensure_ascii=False))
+        out_path = os.path.splitext(md_path)[0] + CHUNKS_SUFFIX
+        atomic_write_text(out_path, "\n".join(lines) + ("\n" if lines else ""))
+        log.info("  Chunks: %d → %s", len(lines), os.path.basename(out_path))
+        return out_path
+    except Exception as e:
+        log.warning("Could not export chunks for %s: %s", os.path.basename(md_path), e)
+        return None
+
+
+def save_output_extras(md_path: str, markdown: str, source: str = "", meta: dict | None = None,
+                       json_content: dict | None = None) -> None:
+    """Everything that follows a saved .md: the search index and, with CHUNK_EXPORT, the chunk JSONL."""
+    index_markdown(md_path, markdown, source=source, meta=meta)
+    if CHUNK_EXPORT:
+        export_chunks(md_path, markdown, source=source, json_content=json_content)
+
+
+def export_chunks_for(target: str) -> tuple[list[str], list[str]]:
+    """Export chunks for every .md under `target` (file or folder); sources come from the resume journal."""
+    if os.path.isfile(target):
+        paths = [os.path.abspath(target)]
+    else:
+        paths = sorted(
+            os.path.join(dirpath, f)
+            for dirpath, _, files in os.walk(target)
+            for f in files if f.lower().endswith(".md")
+        )
+    ok: list[str] = []
+    fail: list[str] = []
+    journals: dict[str, dict] = {}
+    for path in paths:
+        folder = os.path.dirname(path)
+        if folder not in journals:
+            journals[folder] = {os.path.abspath(r.get("output", "")): r for r in load_journal(folder).values()}
+        source = journals[folder].get(os.path.abspath(path), {}).get("input", "")
+        out = export_chunks(path, source=source)
+        (ok if out else fail).append(out or path)
+    return ok, fail
+
+
+# ============================================================
+# ANYTHINGLLM BULK UPLOADER
+# ============================================================
+UPLOAD_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "anythingllm_uploads.jsonl")
+
+
+def anythingllm_session(concurrency: int = ANYTHINGLLM_CONCURRENCY) -> requests.Session:
+    """
+    One pooled session for all uploads: keep-alive connections sized to the
+    worker count, bearer auth, and retries with backoff on connection errors,
+    429 and 5xx (POSTs included — uploads are re-sent whole).
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=ANYTHINGLLM_RETRIES, backoff_factor=1.0, allowed_methods=None,
+                  status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency), max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Authorization"] = f"Bearer {ANYTHINGLLM_API_KEY}"
+    session.headers["Accept"] = "application/json"
+    session.proxies = {"http": None, "https": None}
+    return session
+
+
+def load_upload_journal() -> dict[str, dict]:
+    """Latest upload record per .md path; a torn final line is ignored."""
+    latest: dict[str, dict] = {}
+    try:
+        with open(UPLOAD_JOURNAL_PATH, "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and "path" in rec:
+                    latest[rec["path"]] = rec
+    except OSError:
+        pass
+    return latest
+
+
+def _remove_documents(session: requests.Session, base: str, locations: list[str]) -> None:
+    """Best-effort delete of stored documents; a failure is logged, since the caller is already cleaning up."""
+    if not locations:
+        return
+    try:
+        r = session.delete(f"{base}/api/v1/system/remove-documents", json={"names": locations}, timeout=120)
+        r.raise_for_status()
+    except requests.RequestException as e:
+        log.warning("[PUSH] Could not remove %d stored document(s) from AnythingLLM: %s", len(locations), e)
+
+
+def _upload_document(session: requests.Session, base: str, md_path: str, source: str) -> list[str]:
+    """
+    Send one document to AnythingLLM and return the stored document locations.
+    With a chunk export beside the .md, each chunk goes up as its own raw-text
+    document (title and metadata from the chunk) so AnythingLLM does not
+    re-split it; otherwise the .md file is uploaded as-is. If a chunk fails,
+    the chunks already stored are removed again before the error is raised,
+    so the next --push does not leave duplicates behind.
+    """
+    chunks_path = os.path.splitext(md_path)[0] + CHUNKS_SUFFIX
+    locations: list[str] = []
+    if os.path.isfile(chunks_path):
+        with open(chunks_path, "r", encoding="utf-8") as fh:
+            chunks = [json.loads(line) for line in fh if line.strip()]
+        try:
+            _upload_chunks(session, base, md_path, source, chunks, locations)
+        except (requests.RequestException, ValueError):
+            _remove_documents(session, base, locations)
+            raise
+    else:
+        with open(md_path, "rb") as fh:
+            r = session.post(f"{base}/api/v1/document/upload", timeout=300,
+                             files={"file": (os.path.basename(md_path), fh, "text/markdown")})
+        r.raise_for_status()
+        locations = [d["location"] for d in r.json().get("documents", []) if d.get("location")]
+    if not locations:
+        raise ValueError("AnythingLLM returned no document locations")
+    return locations
+
+
+def _upload_chunks(session: requests.Session, base: str, md_path: str, source: str,
+                   chunks: list[dict], locations: list[str]) -> None:
+    """POST each chunk as a raw-text document, appending the stored locations as they arrive."""
+    for chunk in chunks:
+        title = " › ".join([os.path.splitext(os.path.basename(md_path))[0]] + chunk["headings"])
+        r = session.post(f"{base}/api/v1/document/raw-text", timeout=120, json={
+            "textContent": chunk["text"],
+            "metadata": {
+                "title": f"{title} #{chunk['chunk']}",
+                "docSource": source or md_path,
+                "description": "pages " + ", ".join(map(str, chunk["pages"])) if chunk["pages"] else "",
+                "chunkSource": chunk["id"],
+            },
+        })
+        r.raise_for_status()
+        locations += [d["location"] for d in r.json().get("documents", []) if d.get("location")]
+
+
+def push_to_anythingllm(target: str, workspace: str = ANYTHINGLLM_WORKSPACE,
+                        concurrency: int = ANYTHINGLLM_CONCURRENCY) -> tuple[list[str], list[str]]:
+    """
+    Upload every new or changed .md under `target` to AnythingLLM with
+    `concurrency` workers sharing one pooled session. Unchanged files (same
+    content hash as in anythingllm_uploads.jsonl) are skipped. When a
+    workspace slug is given, new documents are embedded into it and the
+    previous versions of changed documents are removed from it; superseded
+    stored documents are deleted from AnythingLLM either way.
+    Returns (uploaded .md paths, failed .md paths).
+    """
+    if not ANYTHINGLLM_URL or not ANYTHINGLLM_API_KEY:
+        log.error("Set ANYTHINGLLM_URL and ANYTHINGLLM_API_KEY in docling_settings.env to push documents.")
+        return [], []
+    base = ANYTHINGLLM_URL.rstrip("/")
+    if os.path.isfile(target):
+        paths = [os.path.abspath(target)]
+    else:
+        paths = sorted(
+            os.path.abspath(os.path.join(dirpath, f))
+            for dirpath, _, files in os.walk(target)
+            for f in files if f.lower().endswith(".md")
+        )
+    uploaded = load_upload_journal()
+    sources: dict[str, str] = {}
+    pending = []
+    for path in paths:
+        with open(path, "rb") as fh:
+            digest = hashlib.blake2b(fh.read(), digest_size=16).hexdigest()
+        chunks_path = os.path.splitext(path)[0] + CHUNKS_SUFFIX
+        if os.path.isfile(chunks_path):
+            with open(chunks_path, "rb") as fh:
+                digest += ":" + hashlib.blake2b(fh.read(), digest_size=8).hexdigest()
+        if uploaded.get(path, {}).get("hash") != digest:
+            pending.append((path, digest))
+            folder = os.path.dirname(path)
+            if folder not in sources:
+                sources.update({os.path.abspath(r.get("output", "")): r.get("input", "")
+                                for r in load_journal(folder).values()})
+    log.info("[PUSH] %d document(s) under %s — %d new or changed, %d already uploaded",
+             len(paths), target, len(pending), len(paths) - len(pending))
+
+    session = anythingllm_session(concurrency)
+    lock = threading.Lock()
+    ok: list[str] = []
+    fail: list[str] = []
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if not pending:
+                    return
+                path, digest = pending.pop(0)
+            locations: list[str] = []
+            old = uploaded.get(path, {}).get("locations", [])
+            try:
+                locations = _upload_document(session, base, path, sources.get(path, ""))
+                if workspace:
+                    r = session.post(f"{base}/api/v1/workspace/{workspace}/update-embeddings",
+                                     json={"adds": locations, "deletes": old}, timeout=600)
+                    r.raise_for_status()
+            except (requests.RequestException, OSError, ValueError) as e:
+                log.error("[PUSH] ❌ %s: %s", os.path.basename(path), e)
+                # Stored but not journaled: remove them, or the next --push duplicates them
+                _remove_documents(session, base, locations)
+                with lock:
+                    fail.append(path)
+                continue
+            _remove_documents(session, base, old)
+            record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "path": path, "hash": digest,
+                      "locations": locations, "workspace": workspace}
+            with lock:
+                with open(UPLOAD_JOURNAL_PATH, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+                ok.append(path)
+            log.info("[PUSH] ✅ %s (%d document(s))", os.path.basename(path), len(locations))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    session.close()
+    return ok, fail
+
+
+# ============================================================
+# CONTAINER SUPERVISOR
+# ============================================================
+
+class ContainerDownError(RuntimeError):
+    """The Docling container stopped answering its health check mid-conversion."""
+
+
+def describe_container_state(name: str = CONTAINER_NAME) -> str:
+    """Return docker's view of the container (status, OOM-killed flag, exit code)."""
+    try:
+        proc = subprocess.run(
+            ["docker", "inspect", name, "--format",
+             "{{.State.Status}} oom_killed={{.State.OOMKilled}} exit_code={{.State.ExitCode}}"],
+            capture_output=True, text=True, timeout=15,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        return f"unknown (docker inspect failed: {e})"
+    return (proc.stdout or proc.stderr).strip() or "unknown"
+
+
+class ContainerSupervisor:
+    """
+    Owns the Docling base URL for a session and restarts the container when it
+    dies. Restarts go through the PowerShell launcher, which replaces the old
+    container and picks a free port, and are capped by MAX_CONTAINER_RESTARTS.
+    Safe to call from several batch workers at once: only the first worker to
+    report a given dead URL triggers a restart, the rest receive the new URL.
+    Restarts reuse the current image (DOCLING_SKIP_PULL=1), so a batch never
+    waits on `docker pull` or switches image versions halfway through.
+    """
+
+    def __init__(self, base_url: str, ps1_path: str, can_restart: bool = True,
+                 max_restarts: int = MAX_CONTAINER_RESTARTS):
+        self.base_url = base_url
+        self.ps1_path = ps1_path
+        self.can_restart = can_restart
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self._gave_up = False
+        self._lock = threading.Lock()
+
+    def recover(self, failed_url: str, charge: bool = True) -> str | None:
+        """
+        Return a healthy base URL after a crash, or None if recovery is impossible.
+        charge=False restarts without spending the budget — used when the crash
+        came from a file that already crashed the container and is now given up,
+        so one bad file cannot use up the restarts meant for the rest of the batch.
+        """
+        with self._lock:
+            if failed_url != self.base_url:
+                return self.base_url   # another worker already restarted it
+            if self._gave_up:
+                return None
+            state = describe_container_state()
+            log.error("[SUPERVISOR] Container down (%s).", state)
+            if "oom_killed=true" in state:
+                log.error("[SUPERVISOR] Container was OOM-killed — consider fewer --workers.")
+            if not self.can_restart:
+                log.error("[SUPERVISOR] --no-docker is set; cannot restart the container.")
+                self._gave_up = True
+                return None
+            if charge and self.restarts >= self.max_restarts:
+                log.error("[SUPERVISOR] Restart budget (%d) exhausted — giving up.", self.max_restarts)
+                self._gave_up = True
+                return None
+            if charge:
+                self.restarts += 1
+                log.info("[SUPERVISOR] Restarting container (%d/%d)...", self.restarts, self.max_restarts)
+            else:
+                log.info("[SUPERVISOR] Restarting container (not counted against the budget)...")
+            port = run_pull_script_and_get_port(self.ps1_path, env={**os.environ, "DOCLING_SKIP_PULL": "1"})
+            new_url = f"http://localhost:{port}"
+            if not port or not wait_for_docling(new_url):
+                log.error("[SUPERVISOR] Container did not come back — giving up.")
+                self._gave_up = True
+                return None
+            self.base_url = new_url
+            move_admission(failed_url, new_url)
+            log.info("[SUPERVISOR] Container back up at %s.", new_url)
+            return new_url
+
+
+# ============================================================
+# ADMISSION CONTROL (in-flight bytes / pages per endpoint)
+# ============================================================
+_ADMISSION_MIN_FACTOR  = 1 / 16   # budgets never shrink below this share of the configured value
+_ADMISSION_GROW_STEP   = 0.05     # share of the configured budget regained per successful file
+
+
+class AdmissionController:
+    """
+    Caps the input bytes and estimated pages in flight against one Docling
+    endpoint, so a few large documents cannot exhaust the container's (or
+    this process's) memory while worker count alone would allow it. One file
+    is always admitted when nothing is in flight, however large. Smaller
+    files may overtake one that does not fit, but only ADMISSION_MAX_BYPASS
+    times before the oldest waiter gets the next free budget. Budgets halve
+    on request timeouts and container restarts and grow back slowly as
+    files succeed.
+    """
+
+    def __init__(self, name: str, max_mb: float = ADMISSION_MAX_MB, max_pages: int = ADMISSION_MAX_PAGES):
+        self.name = name
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_pages = max_pages
+        self.factor = 1.0
+        self._bytes = 0
+        self._pages = 0
+        self._count = 0
+        self._waiters: list[list] = []   # [ticket, times bypassed], oldest first
+        self._ticket = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, nbytes: int, pages: int) -> bool:
+        if self._count == 0:
+            return True
+        if self.max_bytes and self._bytes + nbytes > self.max_bytes * self.factor:
+            return False
+        if self.max_pages and self._pages + pages > self.max_pages * self.factor:
+            return False
+        return True
+
+    def _take(self, nbytes: int, pages: int) -> None:
+        self._bytes += nbytes
+        self._pages += pages
+        self._count += 1
+
+    def try_admit(self, nbytes: int, pages: int) -> bool:
+        """Admit without waiting if the file fits and no starved file is waiting."""
+        with self._cond:
+            if not self._fits(nbytes, pages):
+                return False
+            if self._waiters:
+                if self._waiters[0][1] >= ADMISSION_MAX_BYPASS:
+                    return False
+                self._waiters[0][1] += 1
+            self._take(nbytes, pages)
+            return True
+
+    def admit(self, nbytes: int, pages: int) -> None:
+        """Block until the file fits within the current budgets."""
+        with self._cond:
+            self._ticket += 1
+            me = [self._ticket, 0]
+            self._waiters.append(me)
+            while not (self._fits(nbytes, pages)
+                       and (self._waiters[0] is me or self._waiters[0][1] < ADMISSION_MAX_BYPASS)):
+                self._cond.wait()
+            if self._waiters[0] is not me:
+                self._waiters[0][1] += 1
+            self._waiters.remove(me)
+            self._take(nbytes, pages)
+
+    def release(self, nbytes: int, pages: int, ok: bool = True) -> None:
+        with self._cond:
+            self._bytes -= nbytes
+            self._pages -= pages
+            self._count -= 1
+            if ok and self.factor < 1.0:
+                self.factor = min(1.0, self.factor + _ADMISSION_GROW_STEP)
+            self._cond.notify_all()
+
+    def shrink(self, reason: str) -> None:
+        """Halve the budgets after a sign of overload (timeout, container restart)."""
+        with self._cond:
+            self.factor = max(_ADMISSION_MIN_FACTOR, self.factor / 2)
+            log.warning("[ADMISSION] %s on %s — in-flight budget now %.0f MB / %d page(s)",
+                        reason, self.name, self.max_bytes * self.factor / (1024 * 1024),
+                        int(self.max_pages * self.factor))
+
+
+_admission: dict[str, AdmissionController] = {}
+_admission_lock = threading.Lock()
+
+
+def admission_for(base_url: str) -> AdmissionController:
+    """The admission controller for one Docling endpoint (created on first use)."""
+    with _admission_lock:
+        if base_url not in _admission:
+            _admission[base_url] = AdmissionController(base_url)
+        return _admission[base_url]
+
+
+def move_admission(old_url: str, new_url: str) -> None:
+    """Carry an endpoint's controller (and its in-flight leases) over to a restarted container."""
+    with _admission_lock:
+        ctl = _admission.pop(old_url, None) or AdmissionController(new_url)
+        ctl.name = new_url
+        _admission[new_url] = ctl
+    ctl.shrink("container restarted")
+
+
+# ============================================================
+# CONTAINER AUTO-TUNING (threads x engine workers)
+# ============================================================
+SETTINGS_ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docling_settings.env")
+
+
+def docker_cpu_count() -> int:
+    """CPUs visible to Docker (the WSL2/Hyper-V VM on Windows), falling back to this host's count."""
+    try:
+        out = subprocess.run(["docker", "info", "--format", "{{.NCPU}}"],
+                             capture_output=True, text=True, timeout=30).stdout.strip()
+        if out.isdigit() and int(out) > 0:
+            return int(out)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return os.cpu_count() or 1
+
+
+def tuning_candidates(cpus: int) -> list[tuple[int, int]]:
+    """(threads per worker, engine workers) pairs that fit in `cpus`, threads and workers in powers of two."""
+    pairs = []
+    workers = 1
+    while workers <= min(cpus, 4):
+        threads = 1
+        while threads * workers <= cpus:
+            pairs.append((threads, workers))
+            threads *= 2
+        workers *= 2
+    # Single-threaded workers are never the best choice once a few cores are available
+    return [p for p in pairs if p[0] > 1 or cpus <= 2]
+
+
+def update_env_file(path: str, values: dict[str, str]) -> None:
+    """Set KEY=value lines in a .env file in place, appending keys it does not have yet."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            lines = fh.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if "=" in line and not line.lstrip().startswith("#") and key in remaining:
+            lines[i] = f"{key}={remaining.pop(key)}"
+    if remaining:
+        lines.append("")
+        lines.append("# Written by --tune-container")
+        lines.extend(f"{k}={v}" for k, v in remaining.items())
+    atomic_write_text(path, "\n".join(lines) + "\n")
+
+
+def _convert_in_parallel(base_url: str, pdfs: list[str], out_dir: str, image_mode: str,
+                         profile: dict, workers: int) -> int:
+    """Convert `pdfs` with `workers` concurrent requests; returns how many succeeded."""
+    pending = list(pdfs)
+    lock = threading.Lock()
+    ok = {"n": 0}
+    quiet = BatchProgress([], workers)   # never started: only silences the per-file spinners
+
+    def worker() -> None:
+        while True:
+            with lock:
+                if not pending:
+                    return
+                pdf = pending.pop(0)
+            try:
+                out = send_pdf_to_docling(base_url, pdf, out_dir, image_mode=image_mode, progress=quiet,
+                                          keep_json=False, profile=profile, extras=False)
+            except ContainerDownError:
+                out = None
+            if out:
+                with lock:
+                    ok["n"] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ok["n"]
+
+
+def tune_container(ps1_path: str, sample_dir: str, image_mode: str, profile: dict) -> dict | None:
+    """
+    Restart the container once per (threads, engine workers) candidate, convert
+    the sample PDFs with as many parallel requests as engine workers and keep
+    the combination with the highest pages per second. The winner is written
+    to docling_settings.env (DOCLING_THREADS, DOCLING_ENGINE_WORKERS,
+    DOCLING_CPUS and BATCH_WORKERS) and the container is left running with it.
+    """
+    pdfs = sorted(
+        os.path.join(sample_dir, f) for f in os.listdir(sample_dir)
+        if f.lower().endswith(".pdf")
+    )
+    if not pdfs:
+        log.error("No PDFs found in sample folder: %s", sample_dir)
+        return None
+    pages = sum(estimate_pdf_pages(p) for p in pdfs)
+    cpus = docker_cpu_count()
+    candidates = tuning_candidates(cpus)
+    log.info("[TUNE] %d CPU(s) available to Docker — trying %d setting(s) on %d PDF(s), ~%d page(s)",
+             cpus, len(candidates), len(pdfs), pages)
+
+    def start(threads: int, workers: int) -> str | None:
+        env = {**os.environ, "DOCLING_THREADS": str(threads), "DOCLING_ENGINE_WORKERS": str(workers),
+               "DOCLING_CPUS": str(threads * workers), "DOCLING_SKIP_PULL": "1"}
+        port = run_pull_script_and_get_port(ps1_path, env=env)
+        base_url = f"http://localhost:{port}"
+        return base_url if port and wait_for_docling(base_url) else None
+
+    rows = []
+    for threads, workers in candidates:
+        log.info("[TUNE] threads=%d x workers=%d ...", threads, workers)
+        base_url = start(threads, workers)
+        if not base_url:
+            log.error("[TUNE] Container did not start with threads=%d workers=%d — skipping.", threads, workers)
+            continue
+        scratch = tempfile.mkdtemp(prefix=f"docling_tune_{threads}x{workers}_")
+        try:
+            # Warm-up: the first request loads the models and would skew the timing
+            _convert_in_parallel(base_url, pdfs[:1], scratch, image_mode, profile, 1)
+            t0 = time.time()
+            ok = _convert_in_parallel(base_url, pdfs, scratch, image_mode, profile, workers)
+            elapsed = time.time() - t0
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        rows.append({"threads": threads, "workers": workers, "ok": ok, "seconds": elapsed,
+                     "pages_per_sec": pages / elapsed if elapsed else 0.0})
+
+    print("\n" + "=" * 70)
+    print(f"  CONTAINER TUNING — {len(pdfs)} PDF(s), ~{pages} page(s), {cpus} CPU(s)")
+    print("=" * 70)
+    print(f"  {'threads':>8}{'workers':>9}{'ok':>8}{'seconds':>10}{'pages/s':>10}")
+    for r in rows:
+        print(f"  {r['threads']:>8}{r['workers']:>9}{str(r['ok']) + '/' + str(len(pdfs)):>8}"
+              f"{r['seconds']:>10.1f}{r['pages_per_sec']:>10.2f}")
+    print("=" * 70)
+
+    complete = [r for r in rows if r["ok"] == len(pdfs)]
+    if not complete:
+        log.error("[TUNE] No setting converted every sample PDF — docling_settings.env left unchanged.")
+        return None
+    best = max(complete, key=lambda r: r["pages_per_sec"])
+    settings = {
+        "DOCLING_THREADS": str(best["threads"]),
+        "DOCLING_ENGINE_WORKERS": str(best["workers"]),
+        "DOCLING_CPUS": str(best["threads"] * best["workers"]),
+        "BATCH_WORKERS": str(best["workers"]),
+    }
+    update_env_file(SETTINGS_ENV_PATH, settings)
+    os.environ.update(settings)
+    print(f"  Best: threads={best['threads']} x workers={best['workers']} "
+          f"({best['pages_per_sec']:.2f} pages/s) — saved to {os.path.basename(SETTINGS_ENV_PATH)}")
+    print("=" * 70 + "\n")
+    start(best["threads"], best["workers"])
+    return best
+
+
+# ============================================================
+# RESUME JOURNAL & ATOMIC WRITES
+# ============================================================
+JOURNAL_NAME = ".docling_journal.jsonl"
+_FINGERPRINT_CHUNK = 1024 * 1024   # bytes hashed from each end of the input file
+_journal_lock = threading.Lock()
+
+
+def atomic_write_text(path: str, text: str) -> None:
+    """
+    Write text to a sibling temp file, fsync it, then rename over `path`.
+    A crash mid-write leaves the old file (or nothing) — never a truncated one.
+    """
+    _atomic_write(path, text, "w", encoding="utf-8")
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Binary counterpart of atomic_write_text."""
+    _atomic_write(path, data, "wb")
+
+
+def _atomic_write(path: str, payload, mode: str, **open_kwargs) -> None:
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, mode, **open_kwargs) as fh:
+            fh.write(payload)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def input_fingerprint(path: str) -> str:
+    """
+    Fingerprint an input file by size, mtime and a hash of its first and last
+    megabyte — cheap even for 400 MB PDFs, and changes whenever the file does.
+    """
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, "rb") as fh:
+        h.update(fh.read(_FINGERPRINT_CHUNK))
+        if st.st_size > 2 * _FINGERPRINT_CHUNK:
+            fh.seek(-_FINGERPRINT_CHUNK, os.SEEK_END)
+            h.update(fh.read(_FINGERPRINT_CHUNK))
+    return h.hexdigest()
+
+
+def append_journal(output_dir: str, record: dict) -> None:
+    """Append one status record to output_dir's journal and fsync it."""
+    record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **record}
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _journal_lock:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, JOURNAL_NAME), "a", encoding="utf-8") as fh:
+            fh.write(line)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+def load_journal(output_dir: str) -> dict[str, dict]:
+    """
+    Replay output_dir's journal and return the latest record per input path.
+    A torn final line from a crash is ignored.
+    """
+    latest: dict[str, dict] = {}
+    try:
+        with open(os.path.join(output_dir, JOURNAL_NAME), "r", encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and "input" in rec:
+                    latest[rec["input"]] = rec
+    except OSError:
+        pass
+    return latest
+
+
+def purge_partial_writes(output_dir: str) -> None:
+    """Remove temp files left behind by interrupted writes, including in <name>_images/ folders."""
+    try:
+        entries = list(os.scandir(output_dir))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.name.endswith("_images") and entry.is_dir():
+            purge_partial_writes(entry.path)
+        elif ".tmp-" in entry.name and entry.is_file():
+            try:
+                os.remove(entry.path)
+                log.info("Removed partial write: %s", entry.name)
+            except OSError:
+                pass
+
+
+def filter_already_converted(
+    pdf_files: list[str],
+    output_dir: str,
+    image_mode: str,
+    profile_name: str = "rag",
+) -> tuple[list[str], list[str]]:
+    """
+    Split pdf_files into (to_convert, already_done) using output_dir's journal.
+    A file counts as done only if its last record is 'ok' for the same image
+    mode and profile, its fingerprint still matches and the recorded .md
+    still exists.
+    """
+    journal = load_journal(output_dir)
+    todo: list[str] = []
+    done: list[str] = []
+    for path in pdf_files:
+        rec = journal.get(os.path.abspath(path))
+        try:
+            if (rec and rec.get("status") == "ok"
+                    and rec.get("image_mode") == image_mode
+                    and rec.get("profile", "rag") == profile_name
+                    and os.path.isfile(rec.get("output", ""))
+                    and rec.get("fingerprint") == input_fingerprint(path)):
+                done.append(rec["output"])
+                continue
+        except OSError:
+            pass
+        todo.append(path)
+    return todo, done
+
+
+# ============================================================
+# BATCH SCHEDULING & ETA
+# ============================================================
+THROUGHPUT_STATS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "docling_throughput.json"
+)
+_DEFAULT_RATES = {"overhead_sec": 3.0, "sec_per_page": 1.5, "sec_per_mb": 0.5}
+_THROUGHPUT_EMA = 0.3   # weight given to each new observation when learning rates
+_PAGE_OBJ_RE = re.compile(rb"/Type\s*/Page(?![A-Za-z])")
+_PAGE_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+_stats_lock = threading.Lock()
+
+
+def estimate_pdf_pages(pdf_path: str) -> int:
+    """
+    Cheap page-count estimate without a PDF library: counts /Type /Page objects
+    in the raw bytes, falling back to the /Pages /Count entry and finally to
+    file size when the page tree is hidden in compressed object streams.
+    """
+    try:
+        size = os.path.getsize(pdf_path)
+        if size == 0:
+            return 0
+        if size > PAGE_SCAN_MAX_MB * 1024 * 1024:
+            return max(1, size // (100 * 1024))
+        with open(pdf_path, "rb") as fh, \
+                mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pages = sum(1 for _ in _PAGE_OBJ_RE.finditer(mm))
+            if not pages:
+                pages = max((int(m.group(1)) for m in _PAGE_COUNT_RE.finditer(mm)), default=0)
+    except (OSError, ValueError):
+        return 1
+    return pages or max(1, size // (100 * 1024))
+
+
+def load_throughput_stats() -> dict:
+    """Load learned conversion rates (keyed by profile:image_mode) from docling_throughput.json."""
+    try:
+        with open(THROUGHPUT_STATS_PATH, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _rates_for(stats: dict, stats_key: str) -> dict:
+    rates = dict(_DEFAULT_RATES)
+    learned = stats.get(stats_key, {})
+    rates.update({k: v for k, v in learned.items() if k in _DEFAULT_RATES})
+    return rates
+
+
+def predict_conversion_seconds(stats: dict, stats_key: str, pages: int, size_mb: float) -> float:
+    """Predicted server time for one PDF: fixed overhead + per-page + per-MB cost."""
+    r = _rates_for(stats, stats_key)
+    return r["overhead_sec"] + r["sec_per_page"] * pages + r["sec_per_mb"] * size_mb
+
+
+def record_throughput(stats: dict, stats_key: str, pages: int, size_mb: float, elapsed: float) -> None:
+    """Nudge the learned rates toward an observed conversion time and persist them."""
+    with _stats_lock:
+        predicted = predict_conversion_seconds(stats, stats_key, pages, size_mb)
+        factor = 1 + _THROUGHPUT_EMA * (elapsed / predicted - 1) if predicted > 0 else 1
+        learned = {k: v * factor for k, v in _rates_for(stats, stats_key).items()}
+        learned["samples"] = stats.get(stats_key, {}).get("samples", 0) + 1
+        stats[stats_key] = learned
+        try:
+            atomic_write_text(THROUGHPUT_STATS_PATH, json.dumps(stats, indent=2))
+        except OSError as e:
+            log.warning("Could not save throughput stats: %s", e)
+
+
+def plan_pdf_batch(
+    pdf_files: list[str],
+    stats_key: str,
+    stats: dict,
+    order: str = "longest",
+) -> list[dict]:
+    """
+    Build one job per PDF with its page count, size and predicted cost, sorted
+    for scheduling. 'longest' starts the most expensive files first so a big
+    PDF never ends up running alone at the tail of a parallel batch.
+    """
+    jobs = []
+    for path in pdf_files:
+        exists = os.path.isfile(path)
+        nbytes = os.path.getsize(path) if exists else 0
+        size_mb = nbytes / (1024 * 1024)
+        pages = estimate_pdf_pages(path) if exists else 0
+        jobs.append({
+            "path": path,
+            "pages": pages,
+            "bytes": nbytes,
+            "size_mb": size_mb,
+            "cost": predict_conversion_seconds(stats, stats_key, pages, size_mb),
+        })
+    if order == "longest":
+        jobs.sort(key=lambda j: j["cost"], reverse=True)
+    elif order == "shortest":
+        jobs.sort(key=lambda j: j["cost"])
+    return jobs
+
+
+def pack_small_jobs(jobs: list[dict], order: str = "longest") -> list[dict]:
+    """
+    Group small PDFs (up to PACK_SMALL_PAGES pages) into multi-file jobs of at
+    most PACK_MAX_FILES files, PACK_MAX_PAGES pages and PACK_MAX_MB, saving a
+    round-trip and the per-request server setup for each. Only files with the
+    same OCR pre-flight result share a request, since the OCR options are
+    per request, and file names within a pack are unique so the ZIP response
+    can be split back. A pack job carries its file jobs under "members".
+    """
+    if PACK_MAX_FILES <= 1:
+        return jobs
+    small = [j for j in jobs if 0 < j["pages"] <= PACK_SMALL_PAGES]
+    if len(small) < 2:
+        return jobs
+    packs: list[tuple[dict, list[dict]]] = []
+    open_packs: dict[tuple, list[dict]] = {}
+    for job in small:
+        ocr = ocr_options_for(job["path"])
+        key = tuple(sorted(ocr.items()))
+        current = open_packs.get(key)
+        stem = os.path.splitext(os.path.basename(job["path"]))[0]
+        if (current is None or len(current) >= PACK_MAX_FILES
+                or sum(m["pages"] for m in current) + job["pages"] > PACK_MAX_PAGES
+                or sum(m["size_mb"] for m in current) + job["size_mb"] > PACK_MAX_MB
+                or any(os.path.splitext(os.path.basename(m["path"]))[0] == stem for m in current)):
+            current = open_packs[key] = []
+            packs.append((ocr, current))
+        current.append(job)
+
+    packed_ids = {id(j) for j in small}
+    planned = [j for j in jobs if id(j) not in packed_ids]
+    for ocr, members in packs:
+        if len(members) == 1:
+            planned.append(members[0])
+            continue
+        planned.append({
+            "path": f"pack:{members[0]['path']}+{len(members) - 1}",
+            "members": members,
+            "ocr": ocr,
+            "pages": sum(m["pages"] for m in members),
+            "bytes": sum(m["bytes"] for m in members),
+            "size_mb": sum(m["size_mb"] for m in members),
+            "cost": sum(m["cost"] for m in members),
+        })
+    if order == "longest":
+        planned.sort(key=lambda j: j["cost"], reverse=True)
+    elif order == "shortest":
+        planned.sort(key=lambda j: j["cost"])
+    return planned
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else f"{m}m{s:02d}s"
+
+
+class BatchProgress:
+    """
+    Thread-safe progress tracker for a whole batch. Prints a single live line
+    (done/total, files in flight, predicted time left) in place of the
+    per-file spinner. Predictions are corrected by how far actual conversion
+    times in this batch have drifted from the model.
+    """
+
+    def __init__(self, jobs: list[dict], workers: int):
+        self._lock = threading.Lock()
+        self._pending = {j["path"]: j["cost"] for j in jobs}
+        self._running: dict[str, float] = {}
+        self._total = len(jobs)
+        self._done = 0
+        self._workers = max(1, workers)
+        self._observed = 0.0
+        self._predicted = 0.0
+        self._start = time.time()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, jobs: list[dict]) -> None:
+        """Extend the tracked work (the daemon keeps one tracker for its whole queue)."""
+        with self._lock:
+            for j in jobs:
+                self._pending[j["path"]] = j["cost"]
+            self._total += len(jobs)
+
+    def started(self, path: str) -> None:
+        with self._lock:
+            self._running[path] = time.time()
+
+    def finished(self, path: str, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            cost = self._pending.pop(path, 0.0)
+            self._running.pop(path, None)
+            self._done += 1
+            if ok:
+                self._observed += elapsed
+                self._predicted += cost
+
+    def requeued(self, path: str) -> None:
+        """Return an in-flight file to the pending pool (e.g. after a container restart)."""
+        with self._lock:
+            self._running.pop(path, None)
+
+    def eta_seconds(self) -> float:
+        with self._lock:
+            correction = self._observed / self._predicted if self._predicted else 1.0
+            now = time.time()
+            left = []
+            for path, cost in self._pending.items():
+                spent = now - self._running[path] if path in self._running else 0.0
+                left.append(max(cost * correction - spent, 0.0))
+        if not left:
+            return 0.0
+        # Parallel workers share the queue, but no batch finishes before its longest file
+        return max(sum(left) / self._workers, max(left))
+
+    def status_line(self) -> str:
+        eta = self.eta_seconds()
+        with self._lock:
+            done, running = self._done, len(self._running)
+        elapsed = time.time() - self._start
+        return (f"[ETA] {done}/{self._total} done, {running} in flight — "
+                f"~{_format_duration(eta)} left (elapsed {_format_duration(elapsed)})")
+
+    def _tick(self) -> None:
+        while not self._stop.wait(ETA_REFRESH_SEC):
+            print("\r" + self.status_line().ljust(79), end="", flush=True)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._tick, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=ETA_REFRESH_SEC + 1)
+        print("\r" + self.status_line().ljust(79))
+
+
+def run_pdf_batch(
+    supervisor: ContainerSupervisor,
+    pdf_files: list[str],
+    output_dir: str,
+    image_mode: str,
+    workers: int = BATCH_WORKERS,
+    order: str = "longest",
+    resume: bool = False,
+    keep_json: bool = KEEP_DOCLING_JSON,
+    profile: dict | None = None,
+) -> tuple[list[str], list[str]]:
+    """
+    Convert a list of PDFs with `workers` parallel requests, scheduled by
+    predicted cost. Uploads, post-processing (POSTPROCESS_WORKERS threads)
+    and writing run as separate stages, so the next upload starts while the
+    previous response is still being recompressed. Every outcome is appended to the output directory's
+    journal; with resume=True, files the journal shows as already converted
+    are skipped. If the container dies, the supervisor restarts it and the
+    in-flight files are requeued; a file that crashes it MAX_FILE_CRASHES
+    times is marked failed instead. Once the restart budget is spent, the
+    remaining files are reported as failed.
+    Returns (converted .md paths, failed input paths).
+    """
+    profile = profile or resolve_profile(DOCLING_PROFILE)
+    purge_partial_writes(output_dir)
+    skipped: list[str] = []
+    if resume:
+        pdf_files, skipped = filter_already_converted(pdf_files, output_dir, image_mode, profile["name"])
+        log.info("[RESUME] %d file(s) already converted — skipping; %d to go.",
+                 len(skipped), len(pdf_files))
+
+    stats = load_throughput_stats()
+    stats_key = f"{profile['name']}:{image_mode}"
+    jobs = plan_pdf_batch(pdf_files, stats_key, stats, order)
+    total_pages = sum(j["pages"] for j in jobs)
+    log.info("[SCHEDULE] %d file(s), ~%d page(s), %d worker(s), order=%s",
+             len(jobs), total_pages, workers, order)
+
+    progress = BatchProgress(jobs, workers)
+    queue_lock = threading.Lock()
+    pending = pack_small_jobs(jobs, order)
+    packs = sum(1 for j in pending if "members" in j)
+    if packs:
+        log.info("[PACK] %d small PDF(s) grouped into %d multi-file request(s)",
+                 sum(len(j["members"]) for j in pending if "members" in j), packs)
+    results_ok: list[str] = list(skipped)
+    results_fail: list[str] = []
+    counter = {"n": 0}
+
+    def worker() -> None:
+        while True:
+            admission = admission_for(supervisor.base_url)
+            with queue_lock:
+                if not pending:
+                    return
+                # Take the next file that fits the in-flight budget; if none does,
+                # wait for the head of the queue so large files still get their turn
+                pick = next((i for i, j in enumerate(pending)
+                             if admission.try_admit(j["bytes"], j["pages"])), None)
+                job = pending.pop(pick or 0)
+                counter["n"] += 1
+                idx = counter["n"]
+                total = idx + len(pending)
+            if pick is None:
+                admission.admit(job["bytes"], job["pages"])
+            pdf_file = job["path"]
+            members = job.get("members")
+            if members:
+                log.info("[%d/%d]  pack of %d small PDF(s): %s  (~%d page(s), predicted %s)", idx, total,
+                         len(members), ", ".join(os.path.basename(m["path"]) for m in members),
+                         job["pages"], _format_duration(job["cost"]))
+                run_pack(job, admission)
+                continue
+            log.info("[%d/%d]  %s  (~%d page(s), predicted %s)", idx, total,
+                     os.path.basename(pdf_file), job["pages"], _format_duration(job["cost"]))
+
+            if not os.path.isfile(pdf_file):
+                log.error("File not found, skipping: %s", pdf_file)
+                admission.release(job["bytes"], job["pages"], ok=False)
+                progress.finished(pdf_file, 0.0, ok=False)
+                with queue_lock:
+                    results_fail.append(pdf_file)
+                continue
+
+            progress.started(pdf_file)
+            t0 = time.time()
+            base_url = supervisor.base_url
+            try:
+                document = request_pdf_conversion(base_url, pdf_file, image_mode, progress, keep_json, profile,
+                                                  admission=admission)
+            except ContainerDownError:
+                admission.release(job["bytes"], job["pages"], ok=False)
+                job["crashes"] = job.get("crashes", 0) + 1
+                poisoned = job["crashes"] >= MAX_FILE_CRASHES
+                if poisoned:
+                    # Already retried on a fresh container: fail (and journal) it and move on
+                    log.error("[SUPERVISOR] %s took the container down %d times — marking it failed.",
+                              os.path.basename(pdf_file), job["crashes"])
+                    write_q.put((job, None, None, time.time() - t0))
+                else:
+                    progress.requeued(pdf_file)
+                    with queue_lock:
+                        pending.insert(0, job)
+                        counter["n"] -= 1
+                with queue_lock:
+                    nothing_left = not pending
+                if poisoned and nothing_left:
+                    # Last queued work: no restart needed. Workers still converting
+                    # hit the dead container and recover it for their own files.
+                    continue
+                if supervisor.recover(base_url, charge=not poisoned):
+                    continue
+                give_up()
+                return
+            elapsed = time.time() - t0
+            admission.release(job["bytes"], job["pages"], ok=document is not None)
+            # Hand off and go straight back for the next upload; failures skip post-processing
+            if document is None:
+                write_q.put((job, None, None, elapsed))
+            else:
+                post_q.put((job, document, elapsed))
+
+    def run_pack(job: dict, admission: AdmissionController) -> None:
+        members = job["members"]
+        for m in members:
+            progress.started(m["path"])
+        t0 = time.time()
+        base_url = supervisor.base_url
+        try:
+            documents = request_pdf_pack(base_url, [m["path"] for m in members], image_mode,
+                                         progress, keep_json, profile, job["ocr"], admission=admission)
+        except ContainerDownError:
+            # Retry the members one by one, so a file that crashes the container
+            # is singled out and cannot fail its neighbours. counter["n"] counts
+            # requests taken: the pack's own slot is returned, and each member
+            # takes one when it is picked up, so [n/total] still ends at the
+            # number of requests actually made.
+            admission.release(job["bytes"], job["pages"], ok=False)
+            for m in members:
+                progress.requeued(m["path"])
+            with queue_lock:
+                pending[0:0] = members
+                counter["n"] -= 1
+            if not supervisor.recover(base_url):
+                give_up()
+            return
+        elapsed = time.time() - t0
+        admission.release(job["bytes"], job["pages"], ok=documents is not None)
+        # Files the pack could not deliver are retried on their own
+        retry = members if documents is None else [m for m in members if m["path"] not in documents]
+        if retry:
+            log.warning("[PACK] %d of %d file(s) not returned — retrying them one by one", len(retry), len(members))
+            for m in retry:
+                progress.requeued(m["path"])
+            with queue_lock:
+                pending[0:0] = retry
+                if documents is None:
+                    counter["n"] -= 1   # nothing delivered: the members replace the pack's slot, as after a crash
+        for m in members:
+            if documents and m["path"] in documents:
+                post_q.put((m, documents[m["path"]], elapsed * m["cost"] / max(job["cost"], 1e-9)))
+
+    def give_up() -> None:
+        """After the supervisor gives up: report every file still queued as failed."""
+        with queue_lock:
+            abandoned = [m["path"] for j in pending for m in j.get("members", [j])]
+            pending.clear()
+            results_fail.extend(abandoned)
+        for path in abandoned:
+            progress.finished(path, 0.0, ok=False)
+
+    def post_worker() -> None:
+        while True:
+            item = post_q.get()
+            if item is None:
+                return
+            job, document, elapsed = item
+            try:
+                markdown = postprocess_pdf_markdown(
+                    document, pdf_output_path(job["path"], output_dir), image_mode, profile)
+            except Exception as e:
+                log.error("Post-processing failed for %s: %s", os.path.basename(job["path"]), e)
+                markdown = None
+            write_q.put((job, document, markdown, elapsed))
+
+    def writer() -> None:
+        while True:
+            item = write_q.get()
+            if item is None:
+                return
+            job, document, markdown, elapsed = item
+            pdf_file = job["path"]
+            out = None
+            if markdown is not None:
+                try:
+                    out = write_pdf_outputs(pdf_output_path(pdf_file, output_dir), markdown, document, keep_json,
+                                            source=os.path.abspath(pdf_file),
+                                            meta={"image_mode": image_mode, "profile": profile["name"]})
+                except OSError as e:
+                    log.error("Could not write output for %s: %s", os.path.basename(pdf_file), e)
+            progress.finished(pdf_file, elapsed, ok=bool(out))
+            if out:
+                record_throughput(stats, stats_key, job["pages"], job["size_mb"], elapsed)
+            try:
+                append_journal(output_dir, {
+                    "input": os.path.abspath(pdf_file),
+                    "fingerprint": input_fingerprint(pdf_file),
+                    "status": "ok" if out else "failed",
+                    "output": out or "",
+                    "image_mode": image_mode,
+                    "profile": profile["name"],
+                })
+            except OSError as e:
+                log.warning("Could not update resume journal: %s", e)
+            with queue_lock:
+                (results_ok if out else results_fail).append(out or pdf_file)
+
+    # Upload -> post-process -> write pipeline. The bounded queues keep at most a
+    # few responses in memory and make uploads wait when post-processing lags.
+    post_workers = max(1, POSTPROCESS_WORKERS)
+    post_q: "queue.Queue" = queue.Queue(maxsize=post_workers)
+    write_q: "queue.Queue" = queue.Queue(maxsize=post_workers)
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    posters = [threading.Thread(target=post_worker, daemon=True) for _ in range(post_workers)]
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    progress.start()
+    try:
+        for t in threads + posters + [writer_thread]:
+            t.start()
+        for t in threads:
+            t.join()
+        for _ in posters:
+            post_q.put(None)
+        for t in posters:
+            t.join()
+        write_q.put(None)
+        writer_thread.join()
+    finally:
+        progress.stop()
+    return results_ok, results_fail
+
+
+# ============================================================
+# LOCAL CONVERSION DAEMON (shared job queue)
+# ============================================================
+DAEMON_HEARTBEAT_SEC = 15   # idle interval between keep-alive events on a progress stream
+DAEMON_RECONNECTS    = 5    # consecutive failed progress-stream reconnects before a client gives up
+DAEMON_KEEP_FINISHED = 100  # finished jobs (and their event logs) kept for GET /jobs; older ones are dropped
+
+
+class FairJobQueue:
+    """
+    Work units (one per PDF, one per slide folder) ordered by job priority
+    (lower = sooner), then by how much work each client has already been
+    served, so one user's 500-file batch cannot starve a colleague's single
+    PDF. A client that goes idle rejoins at the current minimum share rather
+    than with a backlog of credit.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._units: dict[str, list] = {}          # client -> heap of (priority, seq, unit)
+        self._served: dict[str, float] = {}
+        self._seq = 0
+
+    def put(self, unit: dict, front: bool = False) -> None:
+        with self._cond:
+            client = unit["client"]
+            heap = self._units.setdefault(client, [])
+            if not heap:
+                active = [self._served.get(c, 0.0) for c, h in self._units.items() if h and c != client]
+                floor = min(active) if active else 0.0
+                self._served[client] = max(self._served.get(client, 0.0), floor)
+            self._seq += 1
+            seq = -self._seq if front else self._seq
+            heapq.heappush(heap, (unit["priority"], seq, unit))
+            self._cond.notify()
+
+    def take(self) -> dict:
+        """Block until a unit is available and return the fairest one."""
+        with self._cond:
+            while True:
+                ready = [(h[0][0], self._served.get(c, 0.0), h[0][1], c) for c, h in self._units.items() if h]
+                if ready:
+                    client = min(ready)[3]
+                    unit = heapq.heappop(self._units[client])[2]
+                    self._served[client] = self._served.get(client, 0.0) + unit["cost"]
+                    return unit
+                self._cond.wait()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return sum(len(h) for h in self._units.values())
+
+
+def _within_roots(path: str, roots: list[str]) -> bool:
+    """True if `path` (symlinks resolved) is one of `roots` or lies inside one."""
+    real = os.path.normcase(os.path.realpath(path))
+    for root in roots:
+        root = os.path.normcase(os.path.realpath(root)).rstrip(os.sep)
+        if real == root or real.startswith(root + os.sep):
+            return True
+    return False
+
+
+class ConversionDaemon:
+    """
+    Long-running owner of the Docling container. Clients submit jobs over a
+    local HTTP API; `workers` threads drain a FairJobQueue of per-file units
+    through the same conversion, journal and supervisor code as a normal run.
+    Jobs run with the daemon owner's file access, so the API requires the
+    shared `token`, and with `roots` set, inputs and output folders must lie
+    inside one of them.
+    """
+
+    def __init__(self, supervisor: ContainerSupervisor, workers: int,
+                 token: str = DAEMON_TOKEN, roots: list[str] | None = None):
+        self.supervisor = supervisor
+        self.token = token
+        self.roots = DAEMON_ROOTS if roots is None else roots
+        self.workers = max(1, workers)
+        self.queue = FairJobQueue()
+        self.jobs: dict[str, dict] = {}
+        self.changed = threading.Condition()
+        self.stats = load_throughput_stats()
+        self.progress = BatchProgress([], self.workers)
+        self._next_id = 0
+
+    # ── Job lifecycle ─────────────────────────────────────────────────────
+    def submit(self, spec: dict) -> dict:
+        """
+        Validate a job spec, queue its units and return the job record.
+        Raises ValueError for a bad spec, PermissionError for paths outside the allowed roots.
+        """
+        kind = spec.get("kind", "pdf")
+        paths = [os.path.abspath(p) for p in spec.get("paths", [])]
+        output_dir = spec.get("output_dir", "")
+        image_mode = spec.get("image_mode", "strip")
+        if kind not in ("pdf", "images"):
+            raise ValueError(f"unknown job kind: {kind}")
+        if not paths or not output_dir:
+            raise ValueError("'paths' and 'output_dir' are required")
+        if image_mode not in ("strip", "placeholder", "embedded_text", "embedded_full"):
+            raise ValueError(f"unknown image_mode: {image_mode}")
+        output_dir = os.path.normpath(os.path.abspath(output_dir))
+        if self.roots:
+            outside = [p for p in paths + [output_dir] if not _within_roots(p, self.roots)]
+            if outside:
+                raise PermissionError(f"outside DOCLING_DAEMON_ROOTS: {', '.join(outside[:5])}")
+        missing = [p for p in paths if not os.path.isfile(p)]
+        if missing:
+            raise ValueError(f"file(s) not found: {', '.join(missing[:5])}")
+        os.makedirs(output_dir, exist_ok=True)
+        profile = resolve_profile(spec.get("profile") or DOCLING_PROFILE)
+
+        with self.changed:
+            self._next_id += 1
+            job_id = f"{self._next_id:05d}"
+            job = {
+                "id": job_id,
+                "client": str(spec.get("client") or "anonymous"),
+                "priority": int(spec.get("priority", 5)),
+                "kind": kind,
+                "output_dir": output_dir,
+                "output_name": spec.get("output_name") or os.path.basename(os.path.dirname(paths[0])),
+                "image_mode": image_mode,
+                "keep_json": bool(spec.get("keep_json", KEEP_DOCLING_JSON)),
+                "profile": profile,
+                "state": "queued",
+                "total": 0, "done": 0, "ok": [], "fail": [],
+                "events": [],
+                "created": time.time(),
+            }
+            self.jobs[job_id] = job
+
+        skipped: list[str] = []
+        if kind == "pdf" and spec.get("resume"):
+            paths, skipped = filter_already_converted(paths, output_dir, image_mode, profile["name"])
+        if kind == "images":
+            units = [{"path": paths[0], "paths": sorted(paths), "pages": len(paths)}]
+        else:
+            units = [{"path": p, "paths": [p], "pages": estimate_pdf_pages(p)} for p in paths]
+        stats_key = f"{profile['name']}:{image_mode}"
+        for u in units:
+            u.update(job=job, client=job["client"], priority=job["priority"],
+                     bytes=sum(os.path.getsize(p) for p in u["paths"]))
+            u["size_mb"] = u["bytes"] / (1024 * 1024)
+            u["cost"] = predict_conversion_seconds(self.stats, stats_key, u["pages"], u["size_mb"])
+
+        with self.changed:
+            job["total"] = len(units) + len(skipped)
+            job["done"] = len(skipped)
+            job["ok"].extend(skipped)
+        self._event(job, {"type": "queued", "total": job["total"], "skipped": len(skipped),
+                          "queue_length": len(self.queue) + len(units)})
+        self.progress.add([{"path": u["path"], "cost": u["cost"]} for u in units])
+        for u in units:
+            self.queue.put(u)
+        if not units:
+            self._finish(job)
+        log.info("[DAEMON] Job %s from %s: %d %s unit(s), priority %d",
+                 job_id, job["client"], len(units), kind, job["priority"])
+        return job
+
+    def _event(self, job: dict, event: dict) -> None:
+        with self.changed:
+            event = {"seq": len(job["events"]), "job": job["id"], "time": time.time(), **event}
+            job["events"].append(event)
+            self.changed.notify_all()
+
+    def _finish(self, job: dict) -> None:
+        with self.changed:
+            job["state"] = "done" if not job["fail"] else "failed"
+            job["finished"] = time.time()
+        self._event(job, {"type": "finished", "state": job["state"],
+                          "ok": list(job["ok"]), "fail": list(job["fail"])})
+        # Bound memory in a long-running daemon: forget the oldest finished jobs
+        with self.changed:
+            finished = sorted((j for j in self.jobs.values() if "finished" in j), key=lambda j: j["finished"])
+            for old in finished[:-DAEMON_KEEP_FINISHED]:
+                del self.jobs[old["id"]]
+        log.info("[DAEMON] Job %s finished: %d ok, %d failed", job["id"], len(job["ok"]), len(job["fail"]))
+
+    def _run_unit(self, unit: dict) -> None:
+        """
+        Convert one unit and report it. Whatever happens, the admission lease is
+        released and the unit is either requeued (after a container restart) or
+        reported done — an unexpected error counts as a failed file, so the job
+        and the client following it always reach 'finished'.
+        """
+        job = unit["job"]
+        with self.changed:
+            job["state"] = "running"
+        base_url = self.supervisor.base_url
+        admission = admission_for(base_url)
+        admission.admit(unit["bytes"], unit["pages"])
+        self._event(job, {"type": "started", "path": unit["path"]})
+        self.progress.started(unit["path"])
+        t0 = time.time()
+        try:
+            if job["kind"] == "images":
+                out = send_images_to_docling(
+                    base_url, unit["paths"], job["output_dir"], job["output_name"],
+                    image_mode=job["image_mode"], profile=job["profile"], progress=self.progress,
+                    admission=admission,
+                )
+            else:
+                out = send_pdf_to_docling(
+                    base_url, unit["path"], job["output_dir"],
+                    image_mode=job["image_mode"], progress=self.progress,
+                    keep_json=job["keep_json"], profile=job["profile"], admission=admission,
+                )
+        except ContainerDownError:
+            admission.release(unit["bytes"], unit["pages"], ok=False)
+            unit["crashes"] = unit.get("crashes", 0) + 1
+            poisoned = unit["crashes"] >= MAX_FILE_CRASHES
+            if poisoned:
+                log.error("[SUPERVISOR] %s took the container down %d times — marking it failed.",
+                          os.path.basename(unit["path"]), unit["crashes"])
+            else:
+                self.progress.requeued(unit["path"])
+            if self.supervisor.recover(base_url, charge=not poisoned) and not poisoned:
+                self.queue.put(unit, front=True)
+                return
+            self._unit_done(unit, None, time.time() - t0)
+            return
+        except Exception as e:
+            log.error("[DAEMON] Unit %s crashed: %s", unit["path"], e)
+            admission.release(unit["bytes"], unit["pages"], ok=False)
+            self._unit_done(unit, None, time.time() - t0)
+            return
+        elapsed = time.time() - t0
+        admission.release(unit["bytes"], unit["pages"], ok=bool(out))
+        self._unit_done(unit, out, elapsed)
+
+    def _unit_done(self, unit: dict, out: str | None, elapsed: float) -> None:
+        job = unit["job"]
+        self.progress.finished(unit["path"], elapsed, ok=bool(out))
+        if job["kind"] == "pdf":
+            if out:
+                record_throughput(self.stats, f"{job['profile']['name']}:{job['image_mode']}",
+                                  unit["pages"], unit["size_mb"], elapsed)
+            try:
+                append_journal(job["output_dir"], {
+                    "input": unit["path"],
+                    "fingerprint": input_fingerprint(unit["path"]),
+                    "status": "ok" if out else "failed",
+                    "output": out or "",
+                    "image_mode": job["image_mode"],
+                    "profile": job["profile"]["name"],
+                })
+            except OSError as e:
+                log.warning("Could not update resume journal: %s", e)
+        with self.changed:
+            (job["ok"] if out else job["fail"]).append(out or unit["path"])
+            job["done"] += 1
+            finished = job["done"] >= job["total"]
+        self._event(job, {"type": "file_done", "path": unit["path"], "ok": bool(out),
+                          "output": out or "", "done": job["done"], "total": job["total"]})
+        if finished:
+            self._finish(job)
+
+    def _worker(self) -> None:
+        while True:
+            unit = self.queue.take()
+            try:
+                self._run_unit(unit)
+            except Exception as e:   # never let one bad unit kill a worker thread
+                log.error("[DAEMON] Could not report unit %s: %s", unit["path"], e)
+
+    # ── Views for the HTTP API ────────────────────────────────────────────
+    def summary(self, job: dict) -> dict:
+        with self.changed:
+            return {k: job[k] for k in ("id", "client", "priority", "kind", "state", "total", "done",
+                                        "ok", "fail", "output_dir", "image_mode")} | {
+                "profile": job["profile"]["name"]}
+
+    def events_since(self, job: dict, since: int, timeout: float) -> list[dict]:
+        """Events with seq >= since, waiting up to `timeout` seconds for new ones."""
+        with self.changed:
+            if len(job["events"]) <= since:
+                self.changed.wait_for(lambda: len(job["events"]) > since, timeout=timeout)
+            return job["events"][since:]
+
+    def serve(self, port: int = DAEMON_PORT) -> None:
+        for _ in range(self.workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+        handler = type("BoundDaemonHandler", (_DaemonHandler,), {"daemon": self})
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        server.daemon_threads = True
+        log.info("[DAEMON] Listening on http://127.0.0.1:%d — %d worker(s) on %s",
+                 port, self.workers, self.supervisor.base_url)
+        self.progress.start()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            log.info("[DAEMON] Shutting down.")
+        finally:
+            server.server_close()
+            self.progress.stop()
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """
+    Local job API:
+      POST /jobs              submit {"paths", "output_dir", "kind", "image_mode", "profile",
+                              "client", "priority", "keep_json", "resume", "output_name"}
+      GET  /jobs              all jobs;  GET /jobs/<id>  one job
+      GET  /jobs/<id>/events  NDJSON progress stream (?since=N), ends with a 'finished' event
+      GET  /health            daemon + queue status (the only route that needs no token)
+    Every other route requires "Authorization: Bearer <DOCLING_DAEMON_TOKEN>".
+    """
+    daemon: ConversionDaemon = None
+
+    def log_message(self, fmt, *args) -> None:
+        log.debug("[DAEMON] " + fmt, *args)
+
+    def _send_json(self, code: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        """Check the bearer token (constant-time); answers 401 itself when it is missing or wrong."""
+        sent = self.headers.get("Authorization", "").encode("utf-8")
+        if self.daemon.token and hmac.compare_digest(sent, f"Bearer {self.daemon.token}".encode("utf-8")):
+            return True
+        self._send_json(401, {"error": "missing or wrong daemon token (set DOCLING_DAEMON_TOKEN)"})
+        return False
+
+    def do_GET(self) -> None:
+        path, _, query = self.path.partition("?")
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "queued": len(self.daemon.queue)})
+            return
+        if not self._authorized():
+            return
+        if parts == ["jobs"]:
+            with self.daemon.changed:
+                jobs = list(self.daemon.jobs.values())
+            self._send_json(200, [self.daemon.summary(j) for j in jobs])
+            return
+        with self.daemon.changed:
+            job = self.daemon.jobs.get(parts[1]) if len(parts) >= 2 and parts[0] == "jobs" else None
+        if job is None:
+            self._send_json(404, {"error": "not found"})
+        elif len(parts) == 2:
+            self._send_json(200, self.daemon.summary(job))
+        elif parts[2:] == ["events"]:
+            try:
+                since = int(dict(kv.split("=", 1) for kv in query.split("&") if "=" in kv).get("since", 0))
+            except ValueError:
+                since = -1
+            if since < 0:
+                self._send_json(400, {"error": "bad since"})
+                return
+            self._stream_events(job, since)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_events(self, job: dict, since: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            while True:
+                events = self.daemon.events_since(job, since, DAEMON_HEARTBEAT_SEC)
+                if not events:
+                    events = [{"type": "heartbeat", "job": job["id"], "queue_length": len(self.daemon.queue)}]
+                for ev in events:
+                    self.wfile.write((json.dumps(ev, ensure_ascii=False) + "\n").encode("utf-8"))
+                    if ev["type"] == "finished":
+                        self.wfile.flush()
+                        return
+                since += sum(1 for ev in events if ev["type"] != "heartbeat")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # client went away; the job keeps running
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            job = self.daemon.submit(spec)
+        except PermissionError as e:
+            self._send_json(403, {"error": str(e)})
+            return
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(202, self.daemon.summary(job))
+
+
+def submit_job_to_daemon(daemon_url: str, spec: dict) -> tuple[list[str], list[str]]:
+    """
+    Thin-client path: submit a job to a running daemon and follow its progress
+    stream until it finishes. Returns (converted .md paths, failed inputs).
+    If the daemon goes away or forgets the job (it was restarted), files not
+    yet reported as converted are returned as failed.
+    """
+    spec = {"client": f"{getpass.getuser()}@{socket.gethostname()}", **spec}
+    no_proxy = {"http": None, "https": None}
+    auth = {"Authorization": f"Bearer {DAEMON_TOKEN}"}
+    try:
+        r = requests.post(f"{daemon_url}/jobs", json=spec, timeout=60, proxies=no_proxy, headers=auth)
+    except requests.RequestException as e:
+        log.error("Could not reach conversion daemon at %s: %s", daemon_url, e)
+        return [], list(spec.get("paths", []))
+    if r.status_code != 202:
+        log.error("Daemon rejected job: HTTP %d %s", r.status_code, r.text[:300])
+        return [], list(spec.get("paths", []))
+    job_id = r.json()["id"]
+    log.info("[CLIENT] Submitted job %s to %s", job_id, daemon_url)
+
+    since = 0
+    failures = 0
+    ok: list[str] = []
+    done_inputs: set[str] = set()
+
+    def abandon() -> tuple[list[str], list[str]]:
+        return ok, [p for p in map(os.path.abspath, spec.get("paths", [])) if p not in done_inputs]
+
+    while True:
+        try:
+            with requests.get(f"{daemon_url}/jobs/{job_id}/events", params={"since": since},
+                              stream=True, timeout=DAEMON_HEARTBEAT_SEC * 4, proxies=no_proxy,
+                              headers=auth) as resp:
+                if resp.status_code != 200:
+                    log.error("[CLIENT] Daemon no longer has job %s (HTTP %d) — was it restarted? "
+                              "Re-submit with --resume to finish the remaining files.", job_id, resp.status_code)
+                    return abandon()
+                for line in resp.iter_lines():
+                    if not line:
+                        continue
+                    ev = json.loads(line)
+                    if ev["type"] == "heartbeat":
+                        log.info("[CLIENT] Job %s waiting — %d unit(s) in the shared queue",
+                                 job_id, ev.get("queue_length", 0))
+                        continue
+                    if ev["seq"] < since:
+                        continue   # already seen before a reconnect
+                    since = ev["seq"] + 1
+                    failures = 0
+                    if ev["type"] == "queued":
+                        log.info("[CLIENT] Job %s queued: %d file(s), %d already done, queue length %d",
+                                 job_id, ev["total"], ev["skipped"], ev["queue_length"])
+                    elif ev["type"] == "started":
+                        log.info("[CLIENT] Converting %s", os.path.basename(ev["path"]))
+                    elif ev["type"] == "file_done":
+                        log.info("[CLIENT] [%d/%d] %s %s", ev["done"], ev["total"],
+                                 "✅" if ev["ok"] else "❌", os.path.basename(ev["path"]))
+                        if ev["ok"]:
+                            ok.append(ev["output"])
+                            done_inputs.add(ev["path"])
+                    elif ev["type"] == "finished":
+                        return ev["ok"], ev["fail"]
+            reason = "stream ended before the job finished"
+        except (requests.RequestException, ValueError) as e:
+            reason = str(e)
+        failures += 1
+        if failures > DAEMON_RECONNECTS:
+            log.error("[CLIENT] Lost the daemon at %s (%s) — giving up after %d reconnect(s).",
+                      daemon_url, reason, DAEMON_RECONNECTS)
+            return abandon()
+        log.warning("[CLIENT] Progress stream interrupted (%s) — reconnecting (%d/%d)...",
+                    reason, failures, DAEMON_RECONNECTS)
+        time.sleep(HEALTH_CHECK_INTERVAL)
+
+
+# ============================================================
+# CLI ARGUMENT PARSER
+# ============================================================
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Docling PDF-to-Markdown converter for AnythingLLM"
+    )
+    parser.add_argument(
+        "--input", nargs="+", metavar="PDF",
+        help="Path(s) to PDF file(s); bypasses GUI dialogs"
+    )
+    parser.add_argument(
+        "--ps1", default="pull-updated.ps1",
+        help="PowerShell script to start the Docker container (default: pull-updated.ps1)"
+    )
+    parser.add_argument(
+        "--cleanup", action="store_true",
+        help="Delete stale PDF copies left in documents/ by older versions' staging step"
+    )
+    parser.add_argument(
+        "--no-docker", action="store_true",
+        help="Skip PowerShell/Docker startup and connect to an already-running server"
+    )
+    parser.add_argument(
+        "--port", type=int, default=0,
+        help="Port to use when --no-docker is set"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=BATCH_WORKERS,
+        help=f"PDFs to convert in parallel (default: {BATCH_WORKERS}, from BATCH_WORKERS)"
+    )
+    parser.add_argument(
+        "--order", choices=["longest", "shortest", "name"], default="longest",
+        help="Batch scheduling order by predicted cost (default: longest first)"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip PDFs the output folder's journal shows as already converted (unchanged input, same image mode)"
+    )
+    parser.add_argument(
+        "--image-mode", choices=["strip", "placeholder", "embedded_text", "embedded_full"],
+        help="Image handling mode; skips the image mode dialog"
+    )
+    parser.add_argument(
+        "--keep-json", action="store_true", default=KEEP_DOCLING_JSON,
+        help="Also store Docling's JSON document as <name>.docling.json.gz (PDF modes) for local re-rendering"
+    )
+    parser.add_argument(
+        "--profile", choices=sorted(load_profiles()),
+        help="Conversion profile (default: .docling_profile in the input folder, else DOCLING_PROFILE)"
+    )
+    parser.add_argument(
+        "--benchmark-profiles", metavar="SAMPLE_DIR",
+        help="Convert the PDFs in SAMPLE_DIR with every profile, report s/page and output size, then exit"
+    )
+    parser.add_argument(
+        "--tune-container", metavar="SAMPLE_DIR",
+        help="Measure container thread/worker settings on the PDFs in SAMPLE_DIR, save the fastest to docling_settings.env, then exit"
+    )
+    parser.add_argument(
+        "--render-from-json", metavar="PATH",
+        help="Re-render .md files from cached .docling.json.gz file(s) under PATH without Docker, then exit"
+    )
+    parser.add_argument(
+        "--search", metavar="QUERY",
+        help='Search the converted-output index (words, "phrases", AND/OR/NOT, prefix*), then exit'
+    )
+    parser.add_argument(
+        "--index", metavar="PATH",
+        help="Add existing .md outputs under PATH to the search index (unchanged files are skipped), then exit"
+    )
+    parser.add_argument(
+        "--export-chunks", metavar="PATH",
+        help="Write heading-aware <name>.chunks.jsonl files for the .md outputs under PATH, then exit"
+    )
+    parser.add_argument(
+        "--push", metavar="PATH",
+        help="Upload new or changed .md outputs under PATH to AnythingLLM (ANYTHINGLLM_* settings), then exit"
+    )
+    parser.add_argument(
+        "--daemon", action="store_true",
+        help=f"Run as a shared conversion daemon on 127.0.0.1:{DAEMON_PORT} (DOCLING_DAEMON_PORT) instead of converting"
+    )
+    parser.add_argument(
+        "--daemon-url", default=DAEMON_URL, metavar="URL",
+        help="Submit conversions to a running daemon instead of starting Docker (default: DOCLING_DAEMON_URL)"
+    )
+    parser.add_argument(
+        "--priority", type=int, default=5,
+        help="Job priority when submitting to a daemon; lower runs sooner (default: 5)"
+    )
+    return parser.parse_args()
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def main() -> None:
+    args = parse_args()
+
+    print("\n" + "=" * 70)
+    print("  DOCLING TO MARKDOWN CONVERTER FOR ANYTHINGLLM")
+    print("=" * 70)
+
+    # ── Search index — local, no container needed ─────────────────────────
+    if args.index:
+        index_folder(args.index)
+    if args.search:
+        print_search_results(args.search)
+    if args.export_chunks:
+        ok, fail = export_chunks_for(args.export_chunks)
+        print(f"\n[DONE]  {len(ok)}/{len(ok) + len(fail)} document(s) chunked.")
+    if args.push:
+        ok, fail = push_to_anythingllm(args.push)
+        print(f"\n[DONE]  {len(ok)} document(s) pushed to AnythingLLM, {len(fail)} failed.")
+        for r in fail:
+            print(f"      ✗  {r}")
+    if args.index or args.search or args.export_chunks or args.push:
+        return
+
+    # ── Local re-render from cached JSON — no container needed ────────────
+    if args.render_from_json:
+        image_mode = args.image_mode or ask_image_mode_dialog()
+        profile = choose_profile(args.profile, None)
+        ok, fail = render_cached_documents(args.render_from_json, image_mode, profile)
+        print(f"\n[DONE]  {len(ok)}/{len(ok) + len(fail)} document(s) rendered.")
+        for r in fail:
+            print(f"      ✗  {r}")
+        return
+
+    # ── Container tuning — restarts the container per candidate, then exit ─
+    if args.tune_container:
+        if args.no_docker:
+            log.error("--tune-container restarts the container and cannot be combined with --no-docker.")
+            sys.exit(1)
+        profile = choose_profile(args.profile, None)
+        best = tune_container(args.ps1, args.tune_container, args.image_mode or "embedded_full", profile)
+        sys.exit(0 if best else 1)
+
+    daemon_url = (args.daemon_url or "").rstrip("/")
+    if daemon_url and (args.daemon or args.benchmark_profiles):
+        log.error("--daemon-url cannot be combined with --daemon or --benchmark-profiles.")
+        sys.exit(1)
+    if (args.daemon or daemon_url) and not DAEMON_TOKEN:
+        log.error("Set DOCLING_DAEMON_TOKEN in docling_settings.env — the daemon only accepts jobs "
+                  "from clients that send this shared token.")
+        sys.exit(1)
+
+    # ── Start Docling once — stays running for all conversions ────────────
+    if daemon_url:
+        log.info("Submitting conversions to daemon at %s — no local container.", daemon_url)
+        supervisor = None
+    elif args.no_docker:
+        if not args.port:
+            log.error("--no-docker requires --port to be specified.")
+            sys.exit(1)
+        port = args.port
+        log.info("Skipping Docker startup. Using port %d.", port)
+    else:
+        port = run_pull_script_and_get_port(args.ps1)
+        if not port:
+            sys.exit(1)
+
+    if not daemon_url:
+        base_url = f"http://localhost:{port}"
+        if not wait_for_docling(base_url):
+            sys.exit(1)
+        supervisor = ContainerSupervisor(base_url, args.ps1, can_restart=not args.no_docker)
+    tidy_legacy_staging(args.cleanup)
+
+    # ── Shared daemon — own the container and serve other users' jobs ─────
+    if args.daemon:
+        ConversionDaemon(supervisor, args.workers).serve(DAEMON_PORT)
+        return
+
+    # ── Profile benchmark — measure each profile on a sample corpus, then exit ─
+    if args.benchmark_profiles:
+        names = [args.profile] if args.profile else None
+        benchmark_profiles(supervisor, args.benchmark_profiles, args.image_mode or "embedded_full", names)
+        return
+
+    # ── Main loop — repeats until user chooses to quit ────────────────────
+    while True:
+        pdf_files: list[str] = []
+        output_dir: str = ""
+        profile_folder: str | None = None
+
+        if args.input:
+            # CLI mode — skip all dialogs
+            pdf_files = args.input
+            profile_folder = os.path.dirname(os.path.abspath(pdf_files[0]))
+            output_dir = os.path.normpath(os.path.abspath(os.path.join(os.getcwd(), "outputs")))
+            os.makedirs(output_dir, exist_ok=True)
+
+        else:
+            mode = ask_mode_dialog()
+            if not mode:
+                log.info("Cancelled by user — exiting.")
+                break   # exits the while loop cleanly
+
+            if mode == "file":
+                root = tk.Tk()
+                root.withdraw()
+                chosen = filedialog.askopenfilenames(
+                    title="Select PDF file(s) to convert",
+                    filetypes=[("PDF files", "*.pdf"), ("All files", "*.*")]
+                )
+                root.destroy()
+
+                if not chosen:
+                    log.error("No file selected — returning to menu.")
+                    continue   # back to top of loop, show mode dialog again
+
+                pdf_files = list(chosen)
+                profile_folder = os.path.dirname(os.path.abspath(pdf_files[0]))
+                output_dir = os.path.normpath(os.path.abspath(
+                    SINGLE_PDF_OUTPUT_DIR if SINGLE_PDF_OUTPUT_DIR
+                    else os.path.join(os.getcwd(), "outputs")
+                ))
+                os.makedirs(output_dir, exist_ok=True)
+
+            elif mode == "folder":
+                root = tk.Tk()
+                root.withdraw()
                 folder = filedialog.askdirectory(title="Select folder containing PDFs")
                 root.destroy()
 
@@ -982,6 +4056,7 @@ def main() -> None:
                 if not pdf_files:
                     log.info("No PDFs selected — returning to menu.")
                     continue   # back to top of loop
+                profile_folder = folder
 
                 output_dir = ask_output_directory_dialog(folder)
                 if not output_dir:
@@ -1013,14 +4088,24 @@ def main() -> None:
                     log.info("Output directory selection cancelled — returning to menu.")
                     continue
                 os.makedirs(output_dir, exist_ok=True)
-                image_mode = ask_image_mode_dialog()
+                image_mode = args.image_mode or ask_image_mode_dialog()
                 log.info("Image mode selected: %s", image_mode)
                 output_name = os.path.basename(folder)
-                out = send_images_to_docling(
-                    base_url, image_files, output_dir,
-                    output_name=output_name,
-                    image_mode=image_mode,
-                )
+                profile = choose_profile(args.profile, folder)
+                if daemon_url:
+                    ok, _ = submit_job_to_daemon(daemon_url, {
+                        "kind": "images", "paths": image_files, "output_dir": output_dir,
+                        "output_name": output_name, "image_mode": image_mode,
+                        "profile": profile["name"], "priority": args.priority,
+                    })
+                    out = ok[0] if ok else None
+                else:
+                    out = send_images_to_docling(
+                        supervisor.base_url, image_files, output_dir,
+                        output_name=output_name,
+                        image_mode=image_mode,
+                        profile=profile,
+                    )
                 if out:
                     print(f"\n✅ Saved: {out}")
                 else:
@@ -1028,41 +4113,30 @@ def main() -> None:
                 continue
 
         # ── Image Mode Selection ──────────────────────────────────────────
-        image_mode = ask_image_mode_dialog()
+        image_mode = args.image_mode or ask_image_mode_dialog()
         log.info("Image mode selected: %s", image_mode)
+        profile = choose_profile(args.profile, profile_folder)
 
         # ── Conversion Loop ───────────────────────────────────────────────
         log.info("=" * 70)
         log.info("[STEP] Converting %d PDF(s)...", len(pdf_files))
         log.info("=" * 70)
 
-        results_ok: list[str] = []
-        results_fail: list[str] = []
-
-        for i, pdf_file in enumerate(pdf_files, 1):
-            log.info("[%d/%d]  %s", i, len(pdf_files), os.path.basename(pdf_file))
-
-            if not os.path.isfile(pdf_file):
-                log.error("File not found, skipping: %s", pdf_file)
-                results_fail.append(pdf_file)
-                continue
-
-            if use_staging:
-                base_name, _, cur_output_dir = prepare_single_file_directories(pdf_file)
-                pdf_to_send = os.path.join(os.getcwd(), "documents", base_name)
-            else:
-                pdf_to_send = pdf_file
-                cur_output_dir = output_dir
-
-            out = send_pdf_to_docling(
-                base_url, pdf_to_send, cur_output_dir,
-                cleanup=args.cleanup,
-                image_mode=image_mode,
+        if daemon_url:
+            results_ok, results_fail = submit_job_to_daemon(daemon_url, {
+                "kind": "pdf", "paths": pdf_files, "output_dir": output_dir,
+                "image_mode": image_mode, "profile": profile["name"],
+                "priority": args.priority, "resume": args.resume, "keep_json": args.keep_json,
+            })
+        else:
+            results_ok, results_fail = run_pdf_batch(
+                supervisor, pdf_files, output_dir, image_mode,
+                workers=args.workers,
+                order=args.order,
+                resume=args.resume,
+                keep_json=args.keep_json,
+                profile=profile,
             )
-            if out:
-                results_ok.append(out)
-            else:
-                results_fail.append(pdf_file)
 
         # ── Summary ───────────────────────────────────────────────────────
         print("\n" + "=" * 70)